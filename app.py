@@ -1,33 +1,55 @@
+import argparse
+import time
 import cv2
 import numpy as np
-from pyzbar.pyzbar import decode
-import requests
+from car_client import CarClient
+from command_scheduler import CommandScheduler
+from capture import FrameGrabber, PipelineStage, pipeline_stats
+from qr_tracker import QRTracker
+from frame_context import FrameContextPool
+from detectors import DETECTOR, make_detector
+from decode_pool import DecodePool
+from motion import MarkerPredictor
+from metrics import metrics
+from mjpeg import MJPEG_PORT, MjpegServer
+from calibration import load_calibration
+from steering import steering_command  # Speed/steering rule and its distance thresholds
 
 # ESP32 IP and URL for controlling the car (update IP if necessary)
 ESP32_IP = "esp32-car.local"  # Use your ESP32's IP or hostname
-ESP32_URL = f"http://{ESP32_IP}/control"  # Endpoint for car control
+car_client = CarClient(ESP32_IP)  # Shared, non-blocking connection to the car
 
 # Constants
-MAX_SPEED = 255  # Maximum speed of the car
-MIN_DISTANCE = 50  # Minimum distance (in pixels) to stop
-MAX_DISTANCE = 300  # Maximum distance (in pixels) for full speed
-
-# Function to send commands to the ESP32
+CALIBRATED_DISTANCES = True  # Measure on the floor in world units when calibration.npz exists (see calibration.py)
+ROI_TRACKING = True  # Decode only around the last known QR positions between full scans
+DECODE_WORKERS = 0  # Worker processes for full-frame pyzbar scans (0 = decode on the tracking thread)
+MOTION_PREDICTION = True  # Predict QR positions between decodes instead of decoding every frame
+DECODE_EVERY = 3  # Decode every Nth frame when MOTION_PREDICTION is enabled
+METRICS_PORT = 9900  # Local Prometheus endpoint with per-stage latencies (0 = off)
+METRICS_CSV = None  # File to append a metrics snapshot to every 10 seconds (None = off)
+HEADLESS = False  # No windows: serve the annotated feed as MJPEG on MJPEG_PORT instead
+
+# Camera-to-floor calibration, or None to measure in image pixels
+calibration = load_calibration() if CALIBRATED_DISTANCES else None
+
+# Function to send commands to the ESP32 (queued, never blocks the camera loop)
 def send_car_command(command, speed):
-    try:
-        # Construct the URL with command and speed
-        url = f"{ESP32_URL}?cmd={command}&speed={int(speed)}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            print(f"Sent command: {command}, Speed: {speed}")
-        else:
-            print(f"Failed to send command: {response.text}")
-    except Exception as e:
-        print(f"Error sending command: {e}")
-
-# QR code tracking function
-def track_qr_codes(frame):
-    decoded_objects = decode(frame)
+    car_client.control(command, speed)
+
+# Only changed commands go out, rate-limited, with a periodic keepalive
+command_scheduler = CommandScheduler(send_car_command)
+
+# Incremental tracker used when ROI_TRACKING is enabled
+marker_detector = make_detector(DETECTOR)  # Marker detector backend (pyzbar, opencv or aruco), see detectors.py
+qr_tracker = QRTracker(labels=("car", "target"), decoder=marker_detector, roi_decoder=marker_detector)
+frame_contexts = FrameContextPool()  # Reused grayscale/downscaled buffers for detection
+
+# QR code tracking function (on a FrameContext: its grayscale view is computed only when decoding)
+def track_qr_codes(context):
+    if ROI_TRACKING:
+        return qr_tracker.track(context)
+
+    decoded_objects = marker_detector(context.gray)
     car_qr, target_qr = None, None
 
     for obj in decoded_objects:
@@ -39,76 +61,112 @@ def track_qr_codes(frame):
 
     return car_qr, target_qr
 
-# Function to calculate speed based on distance
-def calculate_speed(distance):
-    # Map distance to speed using a linear scale
-    if distance <= MIN_DISTANCE:
-        return 0  # Stop
-    elif distance >= MAX_DISTANCE:
-        return MAX_SPEED  # Full speed
+# Motion model that fills in QR positions between decodes when MOTION_PREDICTION is enabled
+marker_predictor = MarkerPredictor(track_qr_codes, decode_every=DECODE_EVERY)
+
+# Decode stage of the pipeline: returns the frame together with its detections.
+# The motion model is fed the capture time, so decode and queue delays do not skew its velocities.
+def decode_frame(frame, timestamp=None):
+    context = frame_contexts.acquire(frame, timestamp)
+    if MOTION_PREDICTION:
+        car_qr, target_qr = marker_predictor.track(context, timestamp=context.timestamp)
     else:
-        # Linearly scale speed between MIN_DISTANCE and MAX_DISTANCE
-        return ((distance - MIN_DISTANCE) / (MAX_DISTANCE - MIN_DISTANCE)) * MAX_SPEED
+        car_qr, target_qr = track_qr_codes(context)
+    context.release()
+    return frame, car_qr, target_qr
 
 # Main function to process the camera feed
-def process_camera_feed():
-    cap = cv2.VideoCapture(0)  # Use 0 for the default camera
-    if not cap.isOpened():
+# Capture and decode run on their own threads and only ever hand over the newest
+# frame, so the control loop below never acts on a stale, queued-up frame.
+# With headless=True no GUI is used; stop with Ctrl+C.
+def process_camera_feed(headless=HEADLESS):
+    grabber = FrameGrabber(0)  # Use 0 for the default camera
+    if not grabber.isOpened():
         print("Unable to access the camera.")
         return
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to grab frame.")
-            break
-
-        # Detect QR codes
-        car_qr, target_qr = track_qr_codes(frame)
-
-        if car_qr and target_qr:
-            # Calculate center points and distance
-            car_center = car_qr.rect
-            target_center = target_qr.rect
-            distance = np.sqrt((car_center[0] - target_center[0]) ** 2 + (car_center[1] - target_center[1]) ** 2)
-
-            # Calculate speed based on distance
-            speed = calculate_speed(distance)
-
-            # Draw QR code bounding boxes
-            for qr_code, label, color in [(car_qr, "Car", (0, 255, 0)), (target_qr, "Target", (0, 0, 255))]:
-                points = qr_code.polygon
-                if len(points) == 4:
-                    pts = np.array(points, dtype=np.int32).reshape((-1, 1, 2))
-                    cv2.polylines(frame, [pts], True, color, 3)
-                    center = qr_code.rect
-                    cv2.putText(frame, label, (center[0], center[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-
-            # Display distance and speed
-            cv2.putText(frame, f"Distance: {distance:.2f}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
-            cv2.putText(frame, f"Speed: {speed:.0f}", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
-
-            # Determine movement
-            if speed > 0:
-                if target_center[0] < car_center[0] - 50:
-                    send_car_command("left", speed)  # Turn left
-                elif target_center[0] > car_center[0] + 50:
-                    send_car_command("right", speed)  # Turn right
-                else:
-                    send_car_command("forward", speed)  # Move forward
-            else:
-                send_car_command("stop", 0)  # Stop
-
-        # Show the processed frame
-        cv2.imshow("Car Control Feed", frame)
-
-        # Press 'q' to exit
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            send_car_command("stop", 0)  # Stop the car before exiting
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+    # Spread full-frame scans over a process pool (useful for 1080p cameras)
+    # (the pool decodes with pyzbar, so it is only used with that backend)
+    decode_pool = DecodePool(DECODE_WORKERS) if DECODE_WORKERS and DETECTOR == "pyzbar" else None
+    if decode_pool:
+        qr_tracker.decoder = decode_pool.decode
+
+    grabber.start()
+    decoder = PipelineStage("decode", grabber.buffer, decode_frame, timestamps=True).start()
+
+    # Per-stage latency histograms and dropped-frame counters
+    metrics.watch_buffers(grabber.buffer, decoder.output)
+    metrics_server = metrics.serve(METRICS_PORT) if METRICS_PORT else None
+    if METRICS_CSV:
+        metrics.dump_csv(METRICS_CSV)
+    mjpeg_server = MjpegServer(MJPEG_PORT) if headless else None
+
+    try:
+        while True:
+            result = decoder.output.get(timeout=1.0)
+            if result is None:
+                if decoder.output.closed:
+                    break
+                continue
+
+            # QR codes detected by the decode stage
+            frame, car_qr, target_qr = result.data
+
+            if car_qr and target_qr:
+                # Command, speed and distance for this frame
+                command, speed, distance = steering_command(car_qr, target_qr, calibration)
+
+                # Draw QR code bounding boxes
+                for qr_code, label, color in [(car_qr, "Car", (0, 255, 0)), (target_qr, "Target", (0, 0, 255))]:
+                    points = qr_code.polygon
+                    if len(points) == 4:
+                        pts = np.array(points, dtype=np.int32).reshape((-1, 1, 2))
+                        cv2.polylines(frame, [pts], True, color, 3)
+                        center = qr_code.rect
+                        cv2.putText(frame, label, (center[0], center[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+                # Display distance and speed
+                cv2.putText(frame, f"Distance: {distance:.2f}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+                cv2.putText(frame, f"Speed: {speed:.0f}", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+
+                # Send the movement (only changes go out)
+                command_scheduler.submit(command, speed)
+
+            # Time from capture to the control decision for this frame
+            metrics.observe("frame_latency", time.monotonic() - result.timestamp)
+
+            # Show the processed frame (headless: offer it to MJPEG viewers, encoded only if someone watches)
+            with metrics.timer("display"):
+                if headless:
+                    mjpeg_server.publish("feed", frame)
+                    continue
+                cv2.imshow("Car Control Feed", frame)
+
+            # Press 'q' to exit
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                command_scheduler.send_now("stop", 0)  # Stop the car before exiting
+                break
+    except KeyboardInterrupt:
+        command_scheduler.send_now("stop", 0)  # Stop the car before exiting
+
+    decoder.stop()
+    grabber.stop()
+    if decode_pool:
+        decode_pool.close()
+    print(f"Pipeline stats: {pipeline_stats(grabber.buffer, decoder.output)}")
+    command_scheduler.close()
+    print(f"Command stats: {command_scheduler.stats()}")
+    if metrics_server:
+        metrics_server.shutdown()
+    car_client.close()  # Flush the stop command
+    if mjpeg_server:
+        mjpeg_server.close()
+    else:
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    process_camera_feed()
+    parser = argparse.ArgumentParser(description="Drive the car towards the target QR code")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS,
+                        help=f"No windows; stream the annotated feed on http://localhost:{MJPEG_PORT}/")
+    args = parser.parse_args()
+    process_camera_feed(headless=args.headless)
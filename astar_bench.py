@@ -0,0 +1,138 @@
+import argparse
+import time
+from queue import PriorityQueue
+
+import numpy as np
+
+from dstar_lite import IncrementalPlanner
+from mazeapp import SQRT2, astar
+
+GRID_SIZE = 500  # Rows and columns of the benchmark grids
+WALL_DENSITY = 0.25  # Fraction of cells that are walls
+QUERIES = 5  # Start/end pairs per grid
+
+
+# The original PriorityQueue/dict A* from mazeapp.py, kept to check that paths are unchanged
+def astar_reference(maze, start, end):
+    def heuristic(a, b):
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    rows, cols = maze.shape
+    open_set = PriorityQueue()
+    open_set.put((0, start))
+    came_from = {}
+    g_score = {start: 0}
+
+    while not open_set.empty():
+        _, current = open_set.get()
+        if current == end:
+            path = [current]
+            while current in came_from:
+                current = came_from[current]
+                path.append(current)
+            path.reverse()
+            return path
+
+        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            neighbor = (current[0] + dx, current[1] + dy)
+            if not (0 <= neighbor[0] < rows and 0 <= neighbor[1] < cols) or maze[neighbor] == 1:
+                continue
+            tentative_g_score = g_score[current] + 1
+            if tentative_g_score < g_score.get(neighbor, float('inf')):
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g_score
+                open_set.put((tentative_g_score + heuristic(neighbor, end), neighbor))
+    return []
+
+
+# Random grid with the given wall density; start and end cells are kept free
+def random_maze(rng, size=GRID_SIZE, density=WALL_DENSITY):
+    return (rng.random((size, size)) < density).astype(np.uint8)
+
+
+def random_free_cell(rng, maze):
+    while True:
+        cell = (int(rng.integers(maze.shape[0])), int(rng.integers(maze.shape[1])))
+        if maze[cell] == 0:
+            return cell
+
+
+# Length of a grid path, with diagonal moves costing sqrt(2)
+def path_cost(path):
+    return sum(SQRT2 if a[0] != b[0] and a[1] != b[1] else 1.0 for a, b in zip(path, path[1:]))
+
+
+# Randomized regression check of IncrementalPlanner against astar: the car moves along
+# (or jumps off) its path and a few cells flip between plans, fed to the planner either
+# through update_cells or by maze comparison. Returns the number of plans whose result
+# (found/not found, or path cost) differs from astar's.
+def check_incremental(rng, runs=400, steps=100, diagonal=True):
+    mismatches = 0
+    for _ in range(runs):
+        size = int(rng.integers(6, 14))
+        maze = random_maze(rng, size, rng.uniform(0.1, 0.4))
+        start, goal = random_free_cell(rng, maze), random_free_cell(rng, maze)
+        planner = IncrementalPlanner(diagonal=diagonal)
+        for _ in range(steps):
+            path = planner(maze, start, goal)
+            reference = astar(maze, start, goal, diagonal=diagonal)
+            if bool(path) != bool(reference) or abs(path_cost(path) - path_cost(reference)) > 1e-6:
+                mismatches += 1
+                print(f"MISMATCH: {start} -> {goal}, planner {len(path)} cells, astar {len(reference)} cells")
+            move = rng.integers(3)
+            if move == 0 and len(path) > 1:
+                start = path[min(len(path) - 1, int(rng.integers(1, 3)))]
+            elif move == 1:
+                start = (int(rng.integers(size)), int(rng.integers(size)))
+            changed_maze = maze.copy()
+            for row, col in rng.integers(0, size, (int(rng.integers(0, 8)), 2)):
+                changed_maze[row, col] ^= 1
+            changed_maze[start] = changed_maze[goal] = 0
+            changed = np.argwhere(changed_maze != maze)
+            maze = changed_maze
+            if rng.integers(2):
+                planner.update_cells(maze, changed)
+    return mismatches
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark mazeapp.astar against the original implementation")
+    parser.add_argument("--size", type=int, default=GRID_SIZE)
+    parser.add_argument("--density", type=float, default=WALL_DENSITY)
+    parser.add_argument("--queries", type=int, default=QUERIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-reference", action="store_true", help="Only time the new planner")
+    parser.add_argument("--check-incremental", action="store_true",
+                        help="Compare IncrementalPlanner (8-connected) with astar on random changing mazes and exit")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.check_incremental:
+        runs = 400
+        mismatches = check_incremental(rng, runs)
+        print(f"Incremental planner: {mismatches} mismatches in {runs * 100} plans")
+        raise SystemExit(1 if mismatches else 0)
+    maze = random_maze(rng, args.size, args.density)
+    totals = {"astar": 0.0, "astar (8-connected)": 0.0, "reference": 0.0}
+    for i in range(args.queries):
+        start, end = random_free_cell(rng, maze), random_free_cell(rng, maze)
+        path, elapsed = timed(astar, maze, start, end)
+        totals["astar"] += elapsed
+        _, elapsed = timed(astar, maze, start, end, diagonal=True)
+        totals["astar (8-connected)"] += elapsed
+        line = f"query {i}: {start} -> {end}, path length {len(path)}"
+        if not args.skip_reference:
+            reference, elapsed = timed(astar_reference, maze, start, end)
+            totals["reference"] += elapsed
+            line += ", same path" if path == reference else ", PATH DIFFERS"
+        print(line)
+
+    for name, total in totals.items():
+        if total:
+            print(f"{name:<22}{total / args.queries * 1000:>10.1f} ms/query")
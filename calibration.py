@@ -0,0 +1,129 @@
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+from detectors import DETECTOR, make_detector
+
+# Default calibration settings
+CALIBRATION_FILE = "calibration.npz"  # Where the solved homography is stored
+# Reference markers taped to the floor: payload -> position of the marker centre in
+# world units (centimetres). At least four, not all on one line.
+REFERENCE_MARKERS = {
+    "ref:0": (0.0, 0.0),
+    "ref:1": (200.0, 0.0),
+    "ref:2": (200.0, 150.0),
+    "ref:3": (0.0, 150.0),
+}
+WORLD_SIZE = (200.0, 150.0)  # (width, height) of the floor area shown in the top-down view, world units
+VIEW_SCALE = 3.0  # Top-down view pixels per world unit
+
+
+# Camera-to-floor mapping.
+# The homography is solved once from reference markers and saved; on load the
+# cv2.remap tables for the top-down view are built once (fixed-point maps from
+# cv2.convertMaps), so warping a frame is a single table-driven pass.
+class Calibration:
+    def __init__(self, homography, world_size=WORLD_SIZE, view_scale=VIEW_SCALE):
+        self.homography = np.asarray(homography, dtype=np.float64)  # Image pixels -> world units
+        self.world_size = tuple(world_size)
+        self.view_scale = view_scale
+        self.view_size = (int(round(world_size[0] * view_scale)), int(round(world_size[1] * view_scale)))
+        self._build_maps()
+
+    def _build_maps(self):
+        width, height = self.view_size
+        # World position of every top-down pixel, mapped back into the camera image
+        u, v = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+        world = np.stack([u / self.view_scale, v / self.view_scale, np.ones_like(u)], axis=-1)
+        image = world @ np.linalg.inv(self.homography).T
+        map_x = (image[..., 0] / image[..., 2]).astype(np.float32)
+        map_y = (image[..., 1] / image[..., 2]).astype(np.float32)
+        self._map1, self._map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    # Top-down view of a camera frame; pass `dst` to reuse an output buffer between frames
+    def warp(self, frame, dst=None):
+        return cv2.remap(frame, self._map1, self._map2, cv2.INTER_LINEAR, dst=dst)
+
+    # Image pixels (N, 2) -> world units (N, 2), all points at once
+    def to_world(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(points, self.homography).reshape(-1, 2)
+
+    # Image pixels (N, 2) -> top-down view pixels (N, 2)
+    def to_view(self, points):
+        return self.to_world(points) * self.view_scale
+
+    # Image pixels (N, 2) -> (row, col) cells of a grid over the top-down view, clipped to `shape`
+    def to_cells(self, points, cell_size, shape):
+        cells = (self.to_view(points)[:, ::-1] // cell_size).astype(int)
+        return np.clip(cells, 0, np.array(shape) - 1)
+
+    # Bounding rect (left, top, width, height) of a decoded marker in top-down view pixels
+    def view_rect(self, obj):
+        corners = self.to_view(obj.polygon)
+        left, top = corners.min(axis=0)
+        right, bottom = corners.max(axis=0)
+        return left, top, right - left, bottom - top
+
+    def save(self, path=CALIBRATION_FILE):
+        np.savez(path, homography=self.homography, world_size=self.world_size, view_scale=self.view_scale)
+
+    @classmethod
+    def load(cls, path=CALIBRATION_FILE):
+        data = np.load(path)
+        return cls(data["homography"], tuple(data["world_size"]), float(data["view_scale"]))
+
+
+# Calibration from the saved file, or None when the camera has not been calibrated
+def load_calibration(path=CALIBRATION_FILE):
+    if not os.path.exists(path):
+        return None
+    return Calibration.load(path)
+
+
+# Centres (N, 2) of decoded markers, in image pixels
+def marker_centers(markers):
+    return np.array([np.mean(np.array(obj.polygon, dtype=np.float64), axis=0) for obj in markers]).reshape(-1, 2)
+
+
+# Solve the image-to-floor homography from the reference markers visible in a frame
+def solve_homography(frame, references=REFERENCE_MARKERS, detector=None):
+    detector = detector or make_detector(DETECTOR)
+    found = [marker for marker in detector(frame) if marker.data.decode("utf-8") in references]
+    if len(found) < 4:
+        print(f"Found {len(found)} of {len(references)} reference markers, need at least 4.")
+        return None
+    world_points = np.array([references[marker.data.decode("utf-8")] for marker in found])
+    method = cv2.RANSAC if len(found) > 4 else 0
+    homography, _ = cv2.findHomography(marker_centers(found), world_points, method)
+    return homography
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve the camera-to-floor homography from reference markers")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--image", help="Calibrate from an image file instead of the camera")
+    parser.add_argument("--output", default=CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    if args.image:
+        frame = cv2.imread(args.image)
+    else:
+        cap = cv2.VideoCapture(args.camera)
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            print("Unable to access the camera.")
+            raise SystemExit(1)
+
+    homography = solve_homography(frame)
+    if homography is None:
+        raise SystemExit(1)
+    calibration = Calibration(homography)
+    calibration.save(args.output)
+    print(f"Calibration saved as {args.output}")
+    cv2.imshow("Top-Down View", calibration.warp(frame))
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
@@ -0,0 +1,143 @@
+import threading
+import time
+import traceback
+from collections import deque, namedtuple
+
+import cv2
+
+from metrics import metrics
+
+# A frame (or a stage result) tagged with its capture sequence number and time
+Frame = namedtuple("Frame", ["seq", "timestamp", "data"])
+
+
+# Small ring buffer that keeps only the newest items.
+# Writers never wait: when the buffer is full the oldest item is dropped.
+# Readers always get the newest item; older unread items are counted as dropped.
+class FrameBuffer:
+    def __init__(self, name, size=2):
+        self.name = name
+        self._items = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.put_count = 0
+        self.dropped = 0  # Items overwritten or skipped before anyone read them
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify_all()
+
+    # Return the newest unread item, waiting up to `timeout` seconds; None when closed or timed out
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if not self._items:
+                return None
+            item = self._items.pop()
+            self.dropped += len(self._items)
+            self._items.clear()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+# Dedicated capture thread: reads the camera as fast as it delivers frames
+# and publishes them into a FrameBuffer, so readers always see the newest one.
+class FrameGrabber:
+    def __init__(self, source=0, buffer_size=2):
+        self.cap = cv2.VideoCapture(source)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep the driver queue short as well
+        self.buffer = FrameBuffer("capture", buffer_size)
+        self.failed = False
+        self._running = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+        return self
+
+    def _run(self):
+        seq = 0
+        while self._running:
+            with metrics.timer("capture"):
+                ret, frame = self.cap.read()
+            if not ret:
+                print("Failed to grab frame.")
+                self.failed = True
+                break
+            self.buffer.put(Frame(seq, time.monotonic(), frame))
+            seq += 1
+        self.buffer.close()
+
+    def stop(self):
+        self._running = False
+        if self._thread.is_alive():
+            self._thread.join(1.0)
+        self.cap.release()
+        self.buffer.close()
+
+
+# A processing stage running on its own thread at its own pace.
+# It always takes the newest item from its input buffer, applies `func` to it,
+# and publishes the result (with the original seq/timestamp) to its output buffer.
+# With timestamps=True, `func` is called as func(data, timestamp) with the capture time.
+class PipelineStage:
+    def __init__(self, name, source, func, buffer_size=2, timestamps=False):
+        self.name = name
+        self.source = source
+        self.func = func
+        self.timestamps = timestamps
+        self.output = FrameBuffer(name, buffer_size)
+        self.processed = 0
+        self._running = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while self._running:
+                item = self.source.get(timeout=0.5)
+                if item is None:
+                    if self.source.closed:
+                        break
+                    continue
+                with metrics.timer(self.name):
+                    result = self.func(item.data, item.timestamp) if self.timestamps else self.func(item.data)
+                self.output.put(Frame(item.seq, item.timestamp, result))
+                self.processed += 1
+        except Exception:
+            print(f"Pipeline stage {self.name} failed:")
+            traceback.print_exc()
+        finally:
+            self.output.close()  # Never leave readers waiting on a dead stage
+
+    def stop(self):
+        self._running = False
+        if self._thread.is_alive():
+            self._thread.join(1.0)
+        self.output.close()
+
+
+# Per-stage counters for a list of buffers: how many items went in and how many were dropped
+def pipeline_stats(*buffers):
+    return {buffer.name: {"frames": buffer.put_count, "dropped": buffer.dropped} for buffer in buffers}
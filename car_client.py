@@ -0,0 +1,147 @@
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+from path_follower import encode_plan
+
+# Default network settings for talking to the ESP32
+CONNECT_TIMEOUT = 0.5  # Seconds to wait for the TCP connection
+READ_TIMEOUT = 1.0  # Seconds to wait for the ESP32 to answer
+DNS_TTL = 60.0  # Seconds before the resolved address is looked up again
+QUEUE_SIZE = 8  # Pending requests kept before the oldest one is dropped
+
+
+# Shared HTTP client for the car.
+# The vision loop only enqueues requests; a background thread sends them
+# over a kept-alive session so a slow or unreachable car never blocks a frame.
+class CarClient:
+    def __init__(self, host, port=80, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 dns_ttl=DNS_TTL, queue_size=QUEUE_SIZE, verbose=True):
+        self.host = host
+        self.port = port
+        self.timeout = (connect_timeout, read_timeout)
+        self.dns_ttl = dns_ttl
+        self.verbose = verbose
+        self._host_header = host if port == 80 else f"{host}:{port}"
+
+        # One pooled, kept-alive connection to the car (the ESP32 serves one client at a time)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", adapter)
+
+        self._address = None
+        self._resolved_at = 0.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0  # Requests discarded because the queue was full
+        self.errors = 0  # Requests that failed or timed out
+        self.plans_supported = None  # False once the car answered /plan with 404 (only car_sim.py serves it)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Resolve the hostname once and reuse it (mDNS lookups of *.local are slow)
+    def _resolve(self):
+        now = time.monotonic()
+        if self._address is None or now - self._resolved_at > self.dns_ttl:
+            try:
+                info = socket.getaddrinfo(self.host, self.port, socket.AF_INET, socket.SOCK_STREAM)
+                self._address = info[0][4][0]
+            except socket.gaierror as e:
+                print(f"Error resolving {self.host}: {e}")
+                self._address = self.host
+            self._resolved_at = now
+        return self._address
+
+    def _forget_address(self):
+        self._address = None
+
+    # Queue a request without waiting; drops the oldest one if the sender is behind
+    def send(self, path, params=None, future=None):
+        item = (path, params, future)
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                    if dropped is not None and dropped[2] is not None:
+                        dropped[2].set_result(None)  # Nobody waits forever on a dropped fetch
+                    self.dropped += 1
+                    metrics.inc("car_commands_dropped")
+                except queue.Empty:
+                    pass
+
+    # Queue a /control request as used by app.py and mapp.py
+    def control(self, command, speed):
+        self.send("/control", {"cmd": command, "speed": int(speed)})
+
+    # Queue a batched drive plan (see path_follower.py); an empty plan stops the car.
+    # Raises RuntimeError once the car has answered that it has no /plan route.
+    def plan(self, steps, speed):
+        if self.plans_supported is False:
+            raise RuntimeError(f"{self.host} has no /plan route (only car_sim.py serves it)")
+        self.fetch("/plan", {"steps": encode_plan(steps), "speed": int(speed)}).add_done_callback(self._check_plan)
+
+    def _check_plan(self, future):
+        response = future.result()
+        if response is None:
+            return  # Unreachable or dropped: nothing learned about the route
+        if response.status_code == 404 and self.plans_supported is not False:
+            print(f"{self.host} answered /plan with 404, batched plans are not supported by this car")
+        self.plans_supported = response.status_code != 404
+
+    # Queue a request whose response is wanted, e.g. /state; returns a Future of the
+    # response (or None). It goes through the sender thread like every other request,
+    # since the session and its single connection must not be used from two threads.
+    def fetch(self, path, params=None):
+        future = Future()
+        self.send(path, params, future)
+        return future
+
+    # Send a request right away on the calling thread and return the response (or None).
+    # Only safe while nothing else is being sent, use fetch() otherwise.
+    def request(self, path, params=None):
+        url = f"http://{self._resolve()}:{self.port}{path}"
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout,
+                                        headers={"Host": self._host_header})
+        except requests.exceptions.RequestException as e:
+            self.errors += 1
+            metrics.inc("car_command_errors")
+            self._forget_address()  # The car may have a new address, look it up again
+            print(f"Error sending {path}: {e}")
+            return None
+        metrics.observe("car_command_rtt", time.perf_counter() - start)
+        if self.verbose:
+            if response.status_code == 200:
+                print(f"Sent {path} {params or ''}")
+            else:
+                print(f"Failed to send {path}: {response.status_code} {response.text}")
+        return response
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, params, future = item
+            response = self.request(path, params)
+            if future is not None:
+                future.set_result(response)
+
+    # Wait until queued requests are sent, then stop the sender thread
+    def close(self, timeout=2.0):
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self.session.close()
@@ -0,0 +1,320 @@
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from car_client import CarClient
+from command_scheduler import CommandScheduler
+from path_follower import PathFollower, decode_plan
+from udp_control import UDP_PORT, UdpReceiver
+
+# Default simulator settings
+PORT = 8080
+MAX_WHEEL_SPEED = 200.0  # Wheel speed (pixels/second) at PWM 255
+WHEEL_BASE = 60.0  # Distance between the wheels (pixels)
+PHYSICS_RATE = 100.0  # Kinematics updates per second
+CONTROL_RATE = 30.0  # Controller updates per second in the closed-loop test (camera fps)
+ARRIVE_DISTANCE = 50  # Distance (pixels) that counts as reaching the target, as MIN_DISTANCE in app.py
+PATH_CELL = 10  # Pixels per grid cell in the path-following test, as CELL_SIZE in mazeapp.py
+
+
+# Left/right wheel PWM for a command, following the motor pins driven in jj/jj.ino
+# (left: motor 1 only, right: motor 2 only, reverse: both backwards)
+def wheel_speeds(cmd, speed):
+    if cmd == "forward":
+        return speed, speed
+    if cmd in ("backward", "reverse"):
+        return -speed, -speed
+    if cmd == "left":
+        return 0, speed
+    if cmd == "right":
+        return speed, 0
+    return 0, 0
+
+
+# Differential-drive car state, integrated on a background thread
+class SimulatedCar:
+    def __init__(self, x=0.0, y=0.0, heading=0.0):
+        self.x, self.y, self.heading = x, y, heading
+        self.left = self.right = 0  # Wheel PWM (-255..255)
+        self.motor_speed = 255  # Speed used by the /forward-style routes, as motorSpeed in jj.ino
+        self.commands = 0
+        self.plan_steps = 0  # Plan steps started
+        self._plan_id = 0  # Bumped by every command, so a running plan notices it was replaced
+        self._lock = threading.Lock()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def drive(self, cmd, speed):
+        with self._lock:
+            self._plan_id += 1
+            self.left, self.right = wheel_speeds(cmd, max(0, min(255, int(speed))))
+            self.commands += 1
+
+    def set_wheels(self, left, right):
+        with self._lock:
+            self._plan_id += 1
+            self.left, self.right = left, right
+            self.commands += 1
+
+    # Drive a batched plan from path_follower.py open-loop, as a car would from its own timer:
+    # "L"/"R" steps spin on the spot by the given degrees, "F" steps drive straight for the
+    # given distance, each timed from the wheel speed. Any other command cancels the plan.
+    def run_plan(self, steps, speed):
+        with self._lock:
+            self._plan_id += 1
+            plan_id = self._plan_id
+            self.left = self.right = 0
+            self.commands += 1
+        if steps:
+            threading.Thread(target=self._drive_plan, args=(plan_id, steps, speed), daemon=True).start()
+
+    def _drive_plan(self, plan_id, steps, speed):
+        speed = max(1, min(255, int(speed)))
+        v = speed / 255 * MAX_WHEEL_SPEED
+        for kind, value in steps:
+            if kind == "F":
+                wheels, duration = (speed, speed), value / v
+            else:
+                sign = 1 if kind == "L" else -1
+                wheels, duration = (-sign * speed, sign * speed), math.radians(value) * WHEEL_BASE / (2 * v)
+            if not self._plan_step(plan_id, wheels, duration):
+                return
+        self._plan_step(plan_id, (0, 0), 0.0)
+
+    def _plan_step(self, plan_id, wheels, duration):
+        with self._lock:
+            if self._plan_id != plan_id:
+                return False
+            self.left, self.right = wheels
+            self.plan_steps += 1
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            time.sleep(min(0.005, max(deadline - time.monotonic(), 0.0)))
+            if self._plan_id != plan_id:
+                return False
+        return True
+
+    def pose(self):
+        with self._lock:
+            return self.x, self.y, self.heading
+
+    def step(self, dt):
+        with self._lock:
+            v_left = self.left / 255 * MAX_WHEEL_SPEED
+            v_right = self.right / 255 * MAX_WHEEL_SPEED
+            v = (v_left + v_right) / 2
+            # Image coordinates: y grows downwards, so a positive turn rate turns left on screen
+            w = (v_right - v_left) / WHEEL_BASE
+            self.x += v * math.cos(self.heading) * dt
+            self.y -= v * math.sin(self.heading) * dt
+            self.heading = (self.heading + w * dt) % (2 * math.pi)
+
+    def _run(self):
+        dt = 1.0 / PHYSICS_RATE
+        last = time.monotonic()
+        while self._running:
+            time.sleep(dt)
+            now = time.monotonic()
+            self.step(now - last)
+            last = now
+
+    def stop(self):
+        self._running = False
+
+
+# Request handler serving the routes of jj/jj.ino plus the /control route used by app.py/mapp.py.
+# HTTPServer handles one client at a time and HTTP/1.0 closes every connection,
+# like the ESP32 WebServer.
+class CarRequestHandler(BaseHTTPRequestHandler):
+    car = None
+    latency = 0.0  # Fixed delay added to every request (seconds)
+    jitter = 0.0  # Random extra delay, uniform in [0, jitter]
+    loss = 0.0  # Probability that a request is dropped without an answer
+    dropped = 0
+
+    def do_GET(self):
+        if random.random() < self.loss:
+            CarRequestHandler.dropped += 1
+            self.close_connection = True
+            return  # Lost: no command applied, no response sent
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        url = urlparse(self.path)
+        args = {key: values[0] for key, values in parse_qs(url.query).items()}
+        car = self.car
+        if url.path == "/control":
+            car.drive(args.get("cmd", "stop"), float(args.get("speed", 0)))
+        elif url.path in ("/forward", "/reverse", "/left", "/right"):
+            car.drive(url.path[1:], car.motor_speed)
+        elif url.path == "/plan":
+            car.run_plan(decode_plan(args.get("steps", "")), float(args.get("speed", 0)))
+        elif url.path == "/stop":
+            car.drive("stop", 0)
+        elif url.path == "/setSpeed":
+            if "value" in args:
+                car.motor_speed = int(args["value"])
+        elif url.path == "/state":
+            x, y, heading = car.pose()
+            body = json.dumps({"x": x, "y": y, "heading": heading, "left": car.left, "right": car.right}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        elif url.path != "/":
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Start the simulator on a background thread; returns (server, car)
+def start_simulator(port=PORT, latency=0.0, jitter=0.0, loss=0.0, car=None):
+    car = car or SimulatedCar()
+    handler = type("Handler", (CarRequestHandler,), {"car": car, "latency": latency, "jitter": jitter, "loss": loss})
+    server = HTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, car
+
+
+# Also accept the binary UDP control datagrams of udp_control.py; returns the receiver
+def start_udp_receiver(car, port=UDP_PORT):
+    def apply(command, left, right, seq):
+        if command == "wheels":
+            car.set_wheels(left, right)
+        else:
+            car.drive(command, left)
+
+    return UdpReceiver(apply, port)
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return {"p50_ms": float(np.percentile(samples, 50)), "p99_ms": float(np.percentile(samples, 99))}
+
+
+# Command round-trip time as seen by CarClient (synchronous requests)
+def measure_round_trip(port, count=200):
+    client = CarClient("127.0.0.1", port=port, verbose=False)
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        if client.request("/control", {"cmd": "forward", "speed": i % 255}) is not None:
+            samples.append(time.perf_counter() - start)
+    client.request("/control", {"cmd": "stop", "speed": 0})
+    client.close()
+    result = percentiles(samples) if samples else {}
+    result["lost"] = count - len(samples)
+    return result
+
+
+# Heading-aware version of app.py's rule: turn towards the target, otherwise drive forward
+def steer(pose, target):
+    x, y, heading = pose
+    dx, dy = target[0] - x, y - target[1]
+    distance = math.hypot(dx, dy)
+    if distance <= ARRIVE_DISTANCE:
+        return "stop", 0, distance
+    error = (math.atan2(dy, dx) - heading + math.pi) % (2 * math.pi) - math.pi
+    speed = min(255, 80 + distance)
+    if error > 0.3:
+        return "left", speed, distance
+    if error < -0.3:
+        return "right", speed, distance
+    return "forward", speed, distance
+
+
+# Drive the simulated car to `target` through the real command path
+# (CommandScheduler -> CarClient -> HTTP) and report the time to reach it.
+def closed_loop(port, car, target, timeout=30.0):
+    client = CarClient("127.0.0.1", port=port, verbose=False)
+    scheduler = CommandScheduler(client.control)
+    start = time.monotonic()
+    reached = None
+    while time.monotonic() - start < timeout:
+        cmd, speed, distance = steer(car.pose(), target)
+        if cmd == "stop":
+            reached = time.monotonic() - start
+            break
+        scheduler.submit(cmd, speed)
+        time.sleep(1.0 / CONTROL_RATE)
+    scheduler.send_now("stop", 0)
+    scheduler.close()
+    client.close()
+    return {"time_to_target_s": reached, "commands": scheduler.stats(), "client_errors": client.errors}
+
+
+# Drive the simulated car along a grid path (cells of PATH_CELL pixels) with PathFollower
+# batching it into /plan requests; reports the time to the end and how many plans were needed.
+def path_loop(port, car, path, timeout=30.0):
+    client = CarClient("127.0.0.1", port=port, verbose=False)
+    follower = PathFollower(client.plan, cell_length=PATH_CELL)
+    path = np.array(path)
+    start = time.monotonic()
+    reached = None
+    while time.monotonic() - start < timeout:
+        x, y, heading = car.pose()
+        cell = np.array([int(y // PATH_CELL), int(x // PATH_CELL)])
+        # Remaining path from the car's cell, as a planner would return it
+        nearest = int(np.argmin(np.abs(path - cell).sum(axis=1)))
+        remaining = [tuple(cell)] + [tuple(p) for p in path[nearest + 1:]]
+        follower.update(remaining, tuple(cell), heading=math.degrees(heading))
+        if len(remaining) < 2:
+            reached = time.monotonic() - start
+            break
+        time.sleep(1.0 / CONTROL_RATE)
+    client.control("stop", 0)
+    client.close()
+    return {"time_to_end_s": reached, "follower": follower.stats(), "plan_steps": car.plan_steps,
+            "requests": car.commands, "client_errors": client.errors}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the ESP32 car")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Added delay per request (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay per request (seconds)")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability of dropping a request")
+    parser.add_argument("--udp-port", type=int, default=0, help="Also listen for UDP control datagrams on this port")
+    parser.add_argument("--measure", action="store_true", help="Measure command round-trip latency and exit")
+    parser.add_argument("--closed-loop", action="store_true", help="Measure time-to-target and exit")
+    parser.add_argument("--follow-path", action="store_true", help="Drive an L-shaped path with batched plans and exit")
+    args = parser.parse_args()
+
+    server, car = start_simulator(args.port, args.latency, args.jitter, args.loss)
+    print(f"Simulated car listening on http://127.0.0.1:{args.port}")
+    receiver = start_udp_receiver(car, args.udp_port) if args.udp_port else None
+    if receiver:
+        print(f"Listening for UDP control datagrams on port {receiver.port}")
+    if args.measure:
+        print(f"Round trip: {measure_round_trip(args.port)}")
+    elif args.closed_loop:
+        print(f"Closed loop: {closed_loop(args.port, car, target=(400.0, -300.0))}")
+    elif args.follow_path:
+        path = [(0, col) for col in range(30)] + [(-row, 29) for row in range(1, 25)]
+        print(f"Path following: {path_loop(args.port, car, path)}")
+    else:
+        try:
+            while True:
+                time.sleep(1.0)
+                x, y, heading = car.pose()
+                print(f"x={x:.0f} y={y:.0f} heading={math.degrees(heading):.0f} wheels=({car.left}, {car.right})")
+        except KeyboardInterrupt:
+            pass
+    server.shutdown()
+    if receiver:
+        receiver.stop()
+    car.stop()
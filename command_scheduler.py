@@ -0,0 +1,144 @@
+import threading
+import time
+
+# Default scheduling settings
+SPEED_THRESHOLD = 10  # Speed change (0-255) that counts as a new command
+MAX_RATE = 10.0  # Maximum commands per second sent to the car
+KEEPALIVE = 1.0  # Seconds between refreshes of an unchanged command
+
+
+# Latest-wins command scheduler.
+# Callers submit a (cmd, speed) pair every frame; only the newest pair is kept,
+# and it is sent when it differs from the last sent one, at most MAX_RATE times
+# a second. An unchanged command is re-sent every KEEPALIVE seconds.
+class CommandScheduler:
+    def __init__(self, send, speed_threshold=SPEED_THRESHOLD, max_rate=MAX_RATE, keepalive=KEEPALIVE):
+        self._send = send  # Callable taking (cmd, speed), e.g. send_car_command
+        self.speed_threshold = speed_threshold
+        self.min_interval = 1.0 / max_rate
+        self.keepalive = keepalive
+
+        self._lock = threading.Condition()
+        # Held for every call to send, so an immediate command is never overtaken by one
+        # the worker picked before it; taken before _lock, never while holding it
+        self._send_lock = threading.Lock()
+        self._generation = 0  # Bumped by send_now; a worker command picked under an older one is dropped
+        self._pending = None  # Newest submitted (cmd, speed) not yet handled
+        self._latest = None  # Newest submitted (cmd, speed), refreshed by the keepalive
+        self._last_sent = None
+        self._last_sent_at = 0.0
+        self._running = True
+
+        # Counters
+        self.submitted = 0
+        self.sent = 0
+        self.keepalives = 0
+        self.suppressed = 0  # Submissions that were superseded or unchanged
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Check whether a command differs enough from the last sent one to be transmitted.
+    # `speed` may also be a tuple, e.g. (left, right) wheel speeds; each part is compared.
+    def _changed(self, command):
+        if self._last_sent is None:
+            return True
+        cmd, speed = command
+        last_cmd, last_speed = self._last_sent
+        if cmd != last_cmd:
+            return True
+        if isinstance(speed, tuple):
+            return any(abs(a - b) >= self.speed_threshold for a, b in zip(speed, last_speed))
+        return abs(speed - last_speed) >= self.speed_threshold
+
+    # Submit the current command; never blocks
+    def submit(self, cmd, speed):
+        with self._lock:
+            self.submitted += 1
+            if self._pending is not None:
+                self.suppressed += 1  # Superseded before it was sent
+            self._pending = self._latest = (cmd, speed)
+            self._lock.notify()
+
+    def _run(self):
+        with self._lock:
+            while self._running:
+                now = time.monotonic()
+                command = None
+                wait = self.keepalive
+
+                if self._pending is not None:
+                    if not self._changed(self._pending):
+                        # Nothing new, keep the refresh timer but drop the duplicate
+                        self.suppressed += 1
+                        self._pending = None
+                    else:
+                        ready_at = self._last_sent_at + self.min_interval
+                        if now >= ready_at:
+                            command, self._pending = self._pending, None
+                        else:
+                            wait = ready_at - now
+
+                if command is None and self._last_sent is not None and self._pending is None:
+                    refresh_at = self._last_sent_at + self.keepalive
+                    if now >= refresh_at:
+                        command = self._latest or self._last_sent
+                        self.keepalives += 1
+                    else:
+                        wait = refresh_at - now
+
+                if command is None:
+                    self._lock.wait(wait)
+                    continue
+
+                self._last_sent = command
+                self._last_sent_at = now
+                self.sent += 1
+                generation = self._generation
+                self._lock.release()
+                try:
+                    with self._send_lock:
+                        superseded = generation != self._generation
+                        if not superseded:
+                            self._send(*command)
+                finally:
+                    self._lock.acquire()
+                if superseded:
+                    self.sent -= 1
+                    self.suppressed += 1
+
+    # Send a command immediately, bypassing rate limiting (e.g. the final stop).
+    # Waits for a send already in progress, and a command the worker picked
+    # before this call is no longer sent after it.
+    def send_now(self, cmd, speed):
+        with self._send_lock:
+            with self._lock:
+                self._generation += 1
+                if self._pending is not None:
+                    self.suppressed += 1
+                self._pending = None
+                self._last_sent = self._latest = (cmd, speed)
+                self._last_sent_at = time.monotonic()
+                self.sent += 1
+            self._send(cmd, speed)
+
+    # Last (cmd, speed) handed to the car, or None
+    @property
+    def last_sent(self):
+        with self._lock:
+            return self._last_sent
+
+    def stats(self):
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "sent": self.sent,
+                "keepalives": self.keepalives,
+                "suppressed": self.suppressed,
+            }
+
+    def close(self):
+        with self._lock:
+            self._running = False
+            self._lock.notify()
+        self._thread.join(1.0)
@@ -0,0 +1,145 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from qr_tracker import decode_qr, transform_decoded
+
+# Default pool settings
+DECODE_WORKERS = 4  # Worker processes
+TILES = (2, 2)  # Tile grid (rows, cols) used to split one frame across workers
+TILE_OVERLAP = 0.25  # Overlap between neighbouring tiles, as a fraction of the tile size
+
+# Shared-memory blocks a worker process has attached to, by pool slot
+_attached = {}
+
+
+# Runs in a worker process: decode one region of a frame stored in shared memory.
+# When the pool has reallocated a slot (new frame size) the old block is closed, so
+# its mapping is not kept alive in the worker.
+def _decode_region(slot, name, shape, region):
+    shm = _attached.get(slot)
+    if shm is None or shm.name != name:
+        if shm is not None:
+            shm.close()
+        shm = _attached[slot] = shared_memory.SharedMemory(name=name)
+    image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    x0, y0, x1, y1 = region
+    return [transform_decoded(obj, x0, y0) for obj in decode_qr(image[y0:y1, x0:x1])]
+
+
+# Split a frame into a grid of overlapping tiles; returns (x0, y0, x1, y1) windows
+def tile_regions(shape, tiles=TILES, overlap=TILE_OVERLAP):
+    height, width = shape[:2]
+    rows, cols = tiles
+    tile_h, tile_w = height / rows, width / cols
+    pad_y, pad_x = int(tile_h * overlap / 2), int(tile_w * overlap / 2)
+    regions = []
+    for r in range(rows):
+        for c in range(cols):
+            x0, y0 = int(c * tile_w) - pad_x, int(r * tile_h) - pad_y
+            x1, y1 = int((c + 1) * tile_w) + pad_x, int((r + 1) * tile_h) + pad_y
+            regions.append((max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)))
+    return regions
+
+
+# Merge results from overlapping tiles: a code seen in two tiles is kept once (largest copy wins)
+def merge_results(results):
+    merged = []
+    for obj in sorted(results, key=lambda o: o.rect.width * o.rect.height, reverse=True):
+        cx, cy = obj.rect.left + obj.rect.width / 2, obj.rect.top + obj.rect.height / 2
+        duplicate = False
+        for kept in merged:
+            kx, ky = kept.rect.left + kept.rect.width / 2, kept.rect.top + kept.rect.height / 2
+            if kept.data == obj.data and abs(cx - kx) < kept.rect.width / 2 and abs(cy - ky) < kept.rect.height / 2:
+                duplicate = True
+                break
+        if not duplicate:
+            merged.append(obj)
+    return merged
+
+
+# Multi-process QR decoder.
+# Frames are copied once into shared memory and workers decode them in place,
+# so no pixel data is pickled. Two ways of using the pool:
+#   decode(frame)          - split one frame into overlapping tiles across the workers
+#   submit(frame) / get()  - pipeline consecutive frames, results come back in frame order
+# decode() returns the same list of objects as pyzbar's decode, so it can be used as
+# the full-frame decoder of a QRTracker.
+class DecodePool:
+    def __init__(self, workers=DECODE_WORKERS, tiles=TILES, overlap=TILE_OVERLAP):
+        self.workers = workers
+        self.tiles = tiles
+        self.overlap = overlap
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._slots = []  # Shared-memory frame buffers
+        self._inflight = []  # Futures still reading each slot
+        self._shape = None
+        self._next_slot = 0
+        self._pending = deque()  # Futures of submitted frames, oldest first
+
+    def _allocate(self, shape):
+        self._release_slots()
+        size = int(np.prod(shape))
+        count = self.workers * 2 + 1  # Enough frames in flight to keep every worker busy
+        self._slots = [shared_memory.SharedMemory(create=True, size=size) for _ in range(count)]
+        self._inflight = [[] for _ in range(count)]
+        self._shape = shape
+
+    def _release_slots(self):
+        for futures in self._inflight:
+            wait(futures)  # Results stay available on the futures
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
+        self._inflight = []
+
+    # Copy a frame into a free shared-memory slot and return the slot index
+    def _store(self, frame):
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if frame.shape != self._shape:
+            self._allocate(frame.shape)
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % len(self._slots)
+        wait(self._inflight[slot])  # Every slot is in use, wait until the oldest frame is read
+        np.ndarray(self._shape, dtype=np.uint8, buffer=self._slots[slot].buf)[:] = frame
+        return slot
+
+    def _run(self, slot, regions):
+        name = self._slots[slot].name
+        futures = [self._executor.submit(_decode_region, slot, name, self._shape, region) for region in regions]
+        self._inflight[slot] = futures
+        return futures
+
+    @staticmethod
+    def _collect(futures):
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return merge_results(results)
+
+    # Decode one frame split into overlapping tiles across all workers
+    def decode(self, frame):
+        slot = self._store(frame)
+        return self._collect(self._run(slot, tile_regions(self._shape, self.tiles, self.overlap)))
+
+    # Queue a whole frame for decoding on the next free worker
+    def submit(self, frame):
+        slot = self._store(frame)
+        self._pending.append(self._run(slot, [(0, 0, self._shape[1], self._shape[0])]))
+
+    # Results of the oldest submitted frame (blocks until it is decoded)
+    def get(self):
+        return self._collect(self._pending.popleft())
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def close(self):
+        self._executor.shutdown()
+        self._release_slots()
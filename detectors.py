@@ -0,0 +1,113 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from pyzbar.locations import Point, Rect
+
+from qr_tracker import decode_qr
+
+# Default detector settings
+DETECTOR = "pyzbar"  # Backend used by the apps: "pyzbar", "opencv" or "aruco"
+ARUCO_DICTIONARY = cv2.aruco.DICT_4X4_250
+
+# ArUco markers carry a number instead of text. These numbers stand for the payloads
+# used with QR codes: 0 = "car", 1 = "target", 100 + n = "car:n", 200 + n = "target:n".
+ARUCO_NAMES = {0: "car", 1: "target"}
+ARUCO_ID_BASES = {"car": 100, "target": 200}
+ARUCO_IDS_PER_KIND = 50
+
+
+# ArUco number for a payload such as "car" or "car:3"
+def aruco_id(payload):
+    for marker_id, name in ARUCO_NAMES.items():
+        if payload == name:
+            return marker_id
+    kind, _, number = payload.partition(":")
+    if kind in ARUCO_ID_BASES and number.isdigit() and int(number) < ARUCO_IDS_PER_KIND:
+        return ARUCO_ID_BASES[kind] + int(number)
+    raise ValueError(f"No ArUco id for payload: {payload}")
+
+
+def aruco_payload(marker_id):
+    if marker_id in ARUCO_NAMES:
+        return ARUCO_NAMES[marker_id]
+    for kind, base in ARUCO_ID_BASES.items():
+        if base <= marker_id < base + ARUCO_IDS_PER_KIND:
+            return f"{kind}:{marker_id - base}"
+    return f"aruco:{marker_id}"
+
+
+# Detected marker, common to all backends.
+# It has the fields of a pyzbar Decoded object (data, type, rect, polygon, quality),
+# so the trackers, predictor and apps use it unchanged, plus the detector's confidence;
+# id and center are derived from them.
+class Marker(namedtuple("Marker", ["data", "type", "rect", "polygon", "quality", "confidence"])):
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self.data.decode("utf-8")
+
+    @property
+    def center(self):
+        return tuple(np.mean(np.array(self.polygon, dtype=np.float64), axis=0))
+
+
+# Marker from four corners (float, sub-pixel where the backend provides it)
+def make_marker(payload, corners, marker_type, confidence=1.0):
+    corners = np.asarray(corners, dtype=np.float64).reshape(-1, 2)
+    left, top = np.floor(corners.min(axis=0)).astype(int)
+    right, bottom = np.ceil(corners.max(axis=0)).astype(int)
+    polygon = [Point(float(x), float(y)) for x, y in corners]
+    rect = Rect(int(left), int(top), int(right - left), int(bottom - top))
+    return Marker(payload.encode("utf-8"), marker_type, rect, polygon, 1, confidence)
+
+
+# Backends: callables taking a BGR or grayscale image and returning a list of Markers
+
+class PyzbarDetector:
+    name = "pyzbar"
+
+    def __call__(self, image):
+        return [Marker(obj.data, obj.type, obj.rect, obj.polygon, obj.quality, 1.0) for obj in decode_qr(image)]
+
+
+class OpenCVQRDetector:
+    name = "opencv"
+
+    def __init__(self):
+        self._detector = cv2.QRCodeDetector()
+
+    def __call__(self, image):
+        found, payloads, points, _ = self._detector.detectAndDecodeMulti(image)
+        if not found:
+            return []
+        # Codes that were located but not decoded come back as empty strings
+        return [make_marker(payload, corners, "QRCODE") for payload, corners in zip(payloads, points) if payload]
+
+
+class ArucoDetector:
+    name = "aruco"
+
+    def __init__(self, dictionary=ARUCO_DICTIONARY):
+        parameters = cv2.aruco.DetectorParameters()
+        parameters.cornerRefinementMethod = cv2.aruco.CORNER_REFINE_SUBPIX  # Sub-pixel corners
+        self.dictionary = cv2.aruco.getPredefinedDictionary(dictionary)
+        self._detector = cv2.aruco.ArucoDetector(self.dictionary, parameters)
+
+    def __call__(self, image):
+        corners, ids, _ = self._detector.detectMarkers(image)
+        if ids is None:
+            return []
+        return [make_marker(aruco_payload(int(marker_id)), marker_corners, "ARUCO")
+                for marker_id, marker_corners in zip(ids.ravel(), corners)]
+
+
+DETECTORS = {detector.name: detector for detector in (PyzbarDetector, OpenCVQRDetector, ArucoDetector)}
+
+
+# Detector for a backend name from config (DETECTOR in app.py, mapp.py, mazeapp.py)
+def make_detector(name=DETECTOR):
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector: {name} (choose from {', '.join(DETECTORS)})")
+    return DETECTORS[name]()
@@ -0,0 +1,214 @@
+import heapq
+
+import numpy as np
+
+INF = float("inf")
+SQRT2 = 2 ** 0.5
+EPSILON = 1e-9  # Tolerance for comparing keys built from sums of diagonal costs
+
+# Moves (row step, column step, cost) for 4- and 8-connected grids, as in mazeapp.astar
+MOVES_4 = ((-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0))
+MOVES_8 = MOVES_4 + ((-1, -1, SQRT2), (-1, 1, SQRT2), (1, -1, SQRT2), (1, 1, SQRT2))
+
+
+# Incremental grid planner (D* Lite).
+# The search runs backwards from the goal and keeps its g/rhs values between calls,
+# so when the car moves or a few maze cells change only the affected part of the
+# search is repaired. Calling the planner has the same signature and result as
+# mazeapp.astar: planner(maze, start, goal) -> [(row, col), ...] or [] if unreachable.
+# A new goal or maze size starts a fresh search.
+class IncrementalPlanner:
+    def __init__(self, diagonal=False):
+        self.diagonal = diagonal
+        self.moves = MOVES_8 if diagonal else MOVES_4
+        self._maze = None
+        self._goal = None
+        self.expansions = 0  # Cells expanded by the last plan() call
+        self.fallbacks = 0  # Plans that needed a fresh search because the repaired one was inconsistent
+
+    def reset(self, maze, start, goal):
+        self.rows, self.cols = maze.shape
+        size = self.rows * self.cols
+        self._maze = maze.copy()
+        self._walls = (maze == 1).ravel()
+        self._g = np.full(size, INF)
+        self._rhs = np.full(size, INF)
+        self._heap = []
+        self._keys = {}  # Cell -> key it is currently queued with (older heap entries are stale)
+        self._km = 0.0
+        self._goal = goal
+        self._goal_index = goal[0] * self.cols + goal[1]
+        self._last_start = start[0] * self.cols + start[1]
+        self._path = None
+        self._rhs[self._goal_index] = 0
+        self._push(self._goal_index, self._key(self._goal_index))
+
+    def _h(self, a, b):
+        ar, ac = divmod(a, self.cols)
+        br, bc = divmod(b, self.cols)
+        dr, dc = abs(ar - br), abs(ac - bc)
+        if self.diagonal:
+            return dr + dc + (SQRT2 - 2) * min(dr, dc)  # Octile distance
+        return dr + dc  # Manhattan distance
+
+    def _key(self, cell):
+        m = min(self._g[cell], self._rhs[cell])
+        return (m + self._h(self._last_start, cell) + self._km, m)
+
+    # Key ordering that treats keys equal up to floating-point noise as ties
+    @staticmethod
+    def _key_less(a, b):
+        if a[0] < b[0] - EPSILON:
+            return True
+        return a[0] <= b[0] + EPSILON and a[1] < b[1] - EPSILON
+
+    def _push(self, cell, key):
+        self._keys[cell] = key
+        heapq.heappush(self._heap, (key[0], key[1], cell))
+
+    # Smallest live heap entry, dropping stale ones
+    def _top(self):
+        while self._heap:
+            k1, k2, cell = self._heap[0]
+            if self._keys.get(cell) == (k1, k2):
+                return (k1, k2), cell
+            heapq.heappop(self._heap)
+        return None, None
+
+    def _neighbors(self, cell):
+        row, col = divmod(cell, self.cols)
+        for dr, dc, cost in self.moves:
+            r, c = row + dr, col + dc
+            if 0 <= r < self.rows and 0 <= c < self.cols:
+                yield r * self.cols + c, dr, dc, cost
+
+    # Cost of moving from `cell` into `neighbor` (walls and cut corners are impassable)
+    def _cost(self, cell, neighbor, dr, dc, cost):
+        walls = self._walls
+        if walls[neighbor]:
+            return INF
+        if dr and dc and (walls[cell + dc] or walls[cell + dr * self.cols]):
+            return INF
+        return cost
+
+    def _best_rhs(self, cell):
+        best = INF
+        for neighbor, dr, dc, cost in self._neighbors(cell):
+            value = self._cost(cell, neighbor, dr, dc, cost) + self._g[neighbor]
+            if value < best:
+                best = value
+        return best
+
+    def _update_vertex(self, cell):
+        if cell != self._goal_index:
+            self._rhs[cell] = self._best_rhs(cell)
+        if self._g[cell] != self._rhs[cell]:
+            self._push(cell, self._key(cell))
+        else:
+            self._keys.pop(cell, None)
+
+    def _compute_shortest_path(self, start):
+        g, rhs = self._g, self._rhs
+        expansions = 0
+        while True:
+            key, cell = self._top()
+            if cell is None or (not self._key_less(key, self._key(start)) and rhs[start] == g[start]):
+                break
+            expansions += 1
+            new_key = self._key(cell)
+            if self._key_less(key, new_key):
+                self._push(cell, new_key)
+            elif g[cell] > rhs[cell]:
+                g[cell] = rhs[cell]
+                del self._keys[cell]
+                for neighbor, dr, dc, cost in self._neighbors(cell):
+                    if neighbor != self._goal_index:
+                        # Moving from `neighbor` into `cell` is the reverse move
+                        value = self._cost(neighbor, cell, -dr, -dc, cost) + g[cell]
+                        if value < rhs[neighbor]:
+                            rhs[neighbor] = value
+                            self._push(neighbor, self._key(neighbor))
+            else:
+                g[cell] = INF
+                self._update_vertex(cell)
+                for neighbor, _, _, _ in self._neighbors(cell):
+                    self._update_vertex(neighbor)
+        self.expansions = expansions
+
+    # Tell the planner which maze cells changed (e.g. from an occupancy grid update)
+    # (ignored before the first plan or after a size change; the next call starts a fresh search)
+    def update_cells(self, maze, cells):
+        if self._maze is None or maze.shape != self._maze.shape:
+            return
+        changed = False
+        for row, col in cells:
+            cell = row * self.cols + col
+            wall = maze[row, col] == 1
+            self._maze[row, col] = maze[row, col]
+            if self._walls[cell] == wall:
+                continue
+            self._walls[cell] = wall
+            changed = True
+            # Edges into the cell (and diagonals around it) changed: repair the cell and its neighbours
+            self._update_vertex(cell)
+            for neighbor, _, _, _ in self._neighbors(cell):
+                self._update_vertex(neighbor)
+        if changed:
+            self._path = None
+
+    # Greedy walk down g from `start` to the goal. Only locally consistent cells (g == rhs)
+    # are trusted: along those g strictly decreases, so the walk cannot cycle. Returns None
+    # if the walk reaches a cell the last repair left inconsistent.
+    def _extract_path(self, start):
+        g, rhs = self._g, self._rhs
+        if g[start] == INF:
+            return []
+        path = [divmod(start, self.cols)]
+        cell = start
+        while cell != self._goal_index:
+            if g[cell] != rhs[cell]:
+                return None
+            best, best_value = None, INF
+            for neighbor, dr, dc, cost in self._neighbors(cell):
+                value = self._cost(cell, neighbor, dr, dc, cost) + g[neighbor]
+                if value < best_value:
+                    best, best_value = neighbor, value
+            if best is None or len(path) > self.rows * self.cols:
+                return None
+            cell = best
+            path.append(divmod(cell, self.cols))
+        return path
+
+    # Plan from `start` to the current goal, reusing the previous search
+    def plan(self, start):
+        start_index = start[0] * self.cols + start[1]
+        if self._path is not None and start in self._path_index:
+            # Nothing changed and the car is still on the last path: reuse its remainder
+            self.expansions = 0
+            return self._path[self._path_index[start]:]
+        if start_index != self._last_start:
+            self._km += self._h(self._last_start, start_index)
+            self._last_start = start_index
+        self._compute_shortest_path(start_index)
+        path = self._extract_path(start_index)
+        if path is None:
+            # The repaired search left an inconsistent cell on the way: search afresh
+            self.fallbacks += 1
+            self.reset(self._maze, start, self._goal)
+            self._compute_shortest_path(start_index)
+            path = self._extract_path(start_index) or []
+        self._path = path
+        self._path_index = {cell: i for i, cell in enumerate(path)}
+        return path
+
+    def __call__(self, maze, start, goal):
+        rows, cols = maze.shape
+        if not (0 <= start[0] < rows and 0 <= start[1] < cols and 0 <= goal[0] < rows and 0 <= goal[1] < cols):
+            return []
+        if self._maze is None or maze.shape != self._maze.shape or tuple(goal) != self._goal:
+            self.reset(maze, start, tuple(goal))
+        else:
+            changed = np.argwhere(maze != self._maze)
+            if len(changed):
+                self.update_cells(maze, changed)
+        return self.plan(tuple(start))
@@ -0,0 +1,180 @@
+import argparse
+import json
+
+import cv2
+import numpy as np
+
+from steering import steering_command
+from capture import FrameGrabber, PipelineStage, pipeline_stats
+from car_client import CarClient
+from command_scheduler import CommandScheduler
+from qr_tracker import decode_qr
+
+# Car ID -> ESP32 host (optionally "host:port"); overridden by --registry
+FLEET_REGISTRY = {
+    "1": "esp32-car-1.local",
+    "2": "esp32-car-2.local",
+}
+MARKER_COLORS = {"car": (0, 255, 0), "target": (0, 0, 255)}  # BGR outline per marker kind
+
+
+# Split a payload such as "car:3" or "target:7" into (kind, id); plain "car" gives id None
+def parse_marker(data):
+    kind, _, marker_id = data.strip().lower().partition(":")
+    return kind, marker_id.strip() or None
+
+
+# Decode every QR code in the frame and group them by kind: {"car": {id: obj}, "target": {id: obj}}.
+# Codes without an ID are skipped, since they cannot be told apart.
+def detect_markers(frame, decoder=decode_qr):
+    markers = {"car": {}, "target": {}}
+    for obj in decoder(frame):
+        kind, marker_id = parse_marker(obj.data.decode("utf-8"))
+        if kind in markers and marker_id is not None:
+            markers[kind][marker_id] = obj
+    return markers
+
+
+def marker_center(obj):
+    return obj.rect.left + obj.rect.width / 2, obj.rect.top + obj.rect.height / 2
+
+
+# Load a car ID -> host registry from a JSON object such as {"3": "192.168.1.53"}
+def load_registry(path):
+    with open(path) as f:
+        return {str(car_id): host for car_id, host in json.load(f).items()}
+
+
+# Pair cars with targets. A target with the same ID as a car ("car:3" / "target:3") always
+# goes to that car; the rest are handed out greedily, closest pair first.
+# Returns {car_id: target_id}.
+def assign_targets(cars, targets):
+    assignments = {car_id: car_id for car_id in cars if car_id in targets}
+    free_cars = [car_id for car_id in cars if car_id not in assignments]
+    free_targets = [target_id for target_id in targets if target_id not in assignments.values()]
+    if not free_cars or not free_targets:
+        return assignments
+
+    car_points = np.array([marker_center(cars[car_id]) for car_id in free_cars])
+    target_points = np.array([marker_center(targets[target_id]) for target_id in free_targets])
+    distances = np.linalg.norm(car_points[:, None, :] - target_points[None, :, :], axis=2)
+    for _ in range(min(len(free_cars), len(free_targets))):
+        i, j = np.unravel_index(np.argmin(distances), distances.shape)
+        assignments[free_cars[i]] = free_targets[j]
+        distances[i, :] = np.inf
+        distances[:, j] = np.inf
+    return assignments
+
+
+# Commands for several cars.
+# Every car has its own CarClient and CommandScheduler, so each car's requests go
+# out on its own background thread: a slow or unreachable car never delays the
+# others, and dispatch() itself never waits on the network.
+class Fleet:
+    def __init__(self, registry):
+        self.registry = dict(registry)
+        self._cars = {}  # car_id -> (client, scheduler), created on first use
+
+    def _scheduler(self, car_id):
+        if car_id not in self._cars:
+            host = self.registry.get(car_id)
+            if host is None:
+                return None
+            host, _, port = host.partition(":")
+            client = CarClient(host, port=int(port or 80))
+            self._cars[car_id] = (client, CommandScheduler(client.control))
+        return self._cars[car_id][1]
+
+    # Assign targets and queue one command per known car; returns {car_id: (target_id, command, speed)}
+    def dispatch(self, cars, targets):
+        assignments = assign_targets(cars, targets)
+        commands = {}
+        for car_id, car_qr in cars.items():
+            scheduler = self._scheduler(car_id)
+            if scheduler is None:
+                continue  # Not in the registry
+            target_id = assignments.get(car_id)
+            if target_id is None:
+                command, speed = "stop", 0
+            else:
+                command, speed, _ = steering_command(car_qr, targets[target_id])
+            scheduler.submit(command, speed)
+            commands[car_id] = (target_id, command, speed)
+        return commands
+
+    def stop_all(self):
+        for _, scheduler in self._cars.values():
+            scheduler.send_now("stop", 0)
+
+    def stats(self):
+        return {car_id: scheduler.stats() for car_id, (_, scheduler) in self._cars.items()}
+
+    def close(self):
+        for client, scheduler in self._cars.values():
+            scheduler.close()
+            client.close()
+
+
+# Detection stage of the pipeline: returns the frame together with its markers
+def detect_frame(frame):
+    return frame, detect_markers(frame)
+
+
+# Draw every marker with its ID, and a line from each car to its assigned target
+def draw_fleet(frame, markers, commands):
+    for kind, objects in markers.items():
+        for marker_id, obj in objects.items():
+            pts = np.array(obj.polygon, dtype=np.int32).reshape((-1, 1, 2))
+            cv2.polylines(frame, [pts], True, MARKER_COLORS[kind], 3)
+            cv2.putText(frame, f"{kind}:{marker_id}", (obj.rect.left, obj.rect.top - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, MARKER_COLORS[kind], 2)
+    for car_id, (target_id, command, speed) in commands.items():
+        car = markers["car"][car_id]
+        cx, cy = marker_center(car)
+        if target_id is not None:
+            tx, ty = marker_center(markers["target"][target_id])
+            cv2.line(frame, (int(cx), int(cy)), (int(tx), int(ty)), (255, 255, 255), 2)
+        cv2.putText(frame, f"{command} {speed:.0f}", (car.rect.left, car.rect.top + car.rect.height + 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+
+def run_fleet(registry, source=0):
+    grabber = FrameGrabber(source)
+    if not grabber.isOpened():
+        print("Unable to access the camera.")
+        return
+
+    fleet = Fleet(registry)
+    grabber.start()
+    detector = PipelineStage("detect", grabber.buffer, detect_frame).start()
+
+    while True:
+        result = detector.output.get(timeout=1.0)
+        if result is None:
+            if detector.output.closed:
+                break
+            continue
+
+        frame, markers = result.data
+        commands = fleet.dispatch(markers["car"], markers["target"])
+        draw_fleet(frame, markers, commands)
+        cv2.imshow("Fleet Control Feed", frame)
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            fleet.stop_all()
+            break
+
+    detector.stop()
+    grabber.stop()
+    print(f"Pipeline stats: {pipeline_stats(grabber.buffer, detector.output)}")
+    print(f"Command stats: {fleet.stats()}")
+    fleet.close()
+    cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drive several cars (QR codes car:<id>) to targets (target:<id>)")
+    parser.add_argument("--registry", help="JSON file mapping car IDs to ESP32 hosts")
+    parser.add_argument("--camera", type=int, default=0)
+    args = parser.parse_args()
+    run_fleet(load_registry(args.registry) if args.registry else FLEET_REGISTRY, args.camera)
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+# Moves (row step, column step) of the 4-connected grid, as mazeapp.MOVES_4
+MOVES = ((-1, 0), (1, 0), (0, -1), (0, 1))
+CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+UNREACHABLE = -1
+
+
+# Distance (in moves) from `goal` to every cell of a 4-connected maze, -1 where unreachable.
+# Breadth-first wavefront: each step grows the whole frontier at once with cv2.dilate.
+def distance_field(maze, goal):
+    free = (maze != 1).view(np.uint8)
+    dist = np.full(maze.shape, UNREACHABLE, dtype=np.int32)
+    frontier = np.zeros(maze.shape, dtype=np.uint8)
+    frontier[goal] = 1
+    visited = frontier.copy()
+    dist[goal] = 0
+    step = 0
+    while True:
+        step += 1
+        frontier = cv2.dilate(frontier, CROSS) & free & (visited ^ 1)
+        if not frontier.any():
+            return dist
+        dist[frontier == 1] = step
+        visited |= frontier
+
+
+# Reverse-Dijkstra flow field towards one goal.
+# The distance field is computed once per maze or goal change; after that the next
+# move from any cell is a single array lookup, so any number of cars sharing the
+# target cost nothing extra. Among equally short moves the one with more clearance
+# from the walls (cv2.distanceTransform) is preferred when `clearance` is set.
+# Calling the field has the same signature and result as mazeapp.astar (4-connected):
+# field(maze, start, goal) -> [(row, col), ...] or [] if unreachable.
+class FlowField:
+    def __init__(self, clearance=True):
+        self.clearance = clearance
+        self._maze = None
+        self._goal = None
+        self._next = None  # Flat index of the next cell towards the goal, -1 at the goal or unreachable
+        self.rebuilds = 0
+
+    def build(self, maze, goal):
+        rows, cols = maze.shape
+        self._maze = maze.copy()
+        self._goal = goal
+        self.distance = distance_field(maze, goal)
+
+        # Score of stepping into each cell: its distance, minus a tie-break below one move
+        score = self.distance.astype(np.float64)
+        if self.clearance:
+            clear = cv2.distanceTransform((maze != 1).astype(np.uint8), cv2.DIST_L2, 3)
+            score -= 0.5 * clear / (clear.max() + 1)
+        score[self.distance == UNREACHABLE] = np.inf
+        padded = np.pad(score, 1, constant_values=np.inf)
+
+        # Best neighbour of every cell, all cells at once
+        neighbour_scores = np.stack([padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols] for dr, dc in MOVES])
+        best = neighbour_scores.argmin(axis=0)
+        steps = np.array([dr * cols + dc for dr, dc in MOVES])
+        index = np.arange(rows * cols).reshape(rows, cols)
+        self._next = np.where(self.distance > 0, index + steps[best], -1).ravel()
+        self.rebuilds += 1
+
+    # Mark cells as changed (e.g. from an occupancy grid update); the field is rebuilt on next use
+    def update_cells(self, maze, cells):
+        if self._maze is None or maze.shape != self._maze.shape:
+            return
+        rows, cols = np.asarray(cells).reshape(-1, 2).T
+        if np.any((maze[rows, cols] == 1) != (self._maze[rows, cols] == 1)):
+            self._goal = None
+
+    def next_step(self, cell):
+        following = self._next[cell[0] * self._maze.shape[1] + cell[1]]
+        return None if following < 0 else divmod(int(following), self._maze.shape[1])
+
+    def path_from(self, start):
+        if self.distance[start] == UNREACHABLE:
+            return []
+        cols = self._maze.shape[1]
+        path = [tuple(start)]
+        cell = start[0] * cols + start[1]
+        while self._next[cell] >= 0:
+            cell = self._next[cell]
+            path.append(divmod(int(cell), cols))
+        return path
+
+    def __call__(self, maze, start, goal):
+        rows, cols = maze.shape
+        if not (0 <= start[0] < rows and 0 <= start[1] < cols and 0 <= goal[0] < rows and 0 <= goal[1] < cols):
+            return []
+        goal = tuple(goal)
+        if (self._maze is None or goal != self._goal or maze.shape != self._maze.shape
+                or not np.array_equal(maze == 1, self._maze == 1)):
+            self.build(maze, goal)
+        return self.path_from(tuple(start))
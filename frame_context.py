@@ -0,0 +1,101 @@
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from occupancy import CANNY_THRESHOLDS
+
+# Default pool settings
+POOL_SIZE = 4  # Contexts kept for reuse; enough for capture, detection and display to each hold one
+
+
+# Views of one camera frame that several stages need (grayscale, downscaled, edges).
+# Each view is computed lazily, at most once per frame, and written into a buffer the
+# context keeps between frames (OpenCV dst= outputs), so once the pool is warm the hot
+# loop allocates no images. Views stay valid until the context is released.
+class FrameContext:
+    def __init__(self, pool=None):
+        self._pool = pool
+        self._buffers = {}  # name -> preallocated array, reused across frames
+        self._views = {}  # key -> view computed for the current frame
+        self.frame = None
+        self.timestamp = None  # Capture time of the frame (time.monotonic()), if known
+
+    def reset(self, frame, timestamp=None):
+        self.frame = frame
+        self.timestamp = timestamp
+        self._views.clear()
+        return self
+
+    # Preallocated buffer for `name`, reallocated only when the frame size changes
+    def buffer(self, name, shape, dtype=np.uint8):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buf
+
+    @property
+    def gray(self):
+        view = self._views.get("gray")
+        if view is None:
+            if self.frame.ndim == 2:
+                view = self.frame
+            else:
+                view = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY, dst=self.buffer("gray", self.frame.shape[:2]))
+            self._views["gray"] = view
+        return view
+
+    # Grayscale frame downscaled by `scale` (the grayscale view itself at 1.0)
+    def scaled(self, scale):
+        if scale == 1.0:
+            return self.gray
+        key = ("scaled", scale)
+        view = self._views.get(key)
+        if view is None:
+            height, width = self.frame.shape[:2]
+            size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+            view = cv2.resize(self.gray, size, dst=self.buffer(key, size[::-1]), interpolation=cv2.INTER_AREA)
+            self._views[key] = view
+        return view
+
+    # Canny edges of the grayscale view, as occupancy.edge_image computes them
+    def edges(self, thresholds=CANNY_THRESHOLDS):
+        key = ("edges", thresholds)
+        view = self._views.get(key)
+        if view is None:
+            view = cv2.Canny(self.gray, *thresholds, edges=self.buffer(key, self.gray.shape))
+            self._views[key] = view
+        return view
+
+    # Hand the context back to its pool once nothing uses its views any more
+    def release(self):
+        self.frame = self.timestamp = None
+        self._views.clear()
+        if self._pool is not None:
+            self._pool.release(self)
+
+
+# Recycles FrameContexts (and with them their buffers) between frames.
+# Stages pass the context along with the frame; the last one to use it releases it.
+# A context that is never released (e.g. its frame was dropped by a FrameBuffer) is
+# simply garbage collected and the pool makes a new one.
+class FrameContextPool:
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._free = deque()
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def acquire(self, frame, timestamp=None):
+        with self._lock:
+            context = self._free.pop() if self._free else None
+            if context is None:
+                context = FrameContext(self)
+                self.created += 1
+        return context.reset(frame, timestamp)
+
+    def release(self, context):
+        with self._lock:
+            if len(self._free) < self.size:
+                self._free.append(context)
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+
+from aiohttp import WSMsgType, web
+
+from car_client import CarClient
+from command_scheduler import CommandScheduler
+
+# Default gateway settings
+ESP32_IP = "esp32-car.local"  # Car the gateway forwards commands to
+GATEWAY_PORT = 5000  # Port the browser connects to
+STATE_INTERVAL = 0.5  # Seconds between car state broadcasts to WebSocket clients
+COMMANDS = ("forward", "backward", "left", "right", "stop")
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+
+# Validate a command from a browser; returns (cmd, speed) or raises ValueError
+def parse_command(cmd, speed):
+    if cmd not in COMMANDS:
+        raise ValueError(f"Unknown command: {cmd}")
+    speed = float(speed)
+    if not math.isfinite(speed):
+        raise ValueError(f"Invalid speed: {speed}")
+    return cmd, max(0, min(255, int(speed)))
+
+
+# Web gateway between browsers and the car.
+# All browsers share one CarClient (one pooled, kept-alive connection to the car) behind
+# one CommandScheduler, so input from every client is coalesced latest-wins and only
+# changes go upstream. Sending happens on the client's thread, never on the event loop.
+# Browsers can use the original /control GET or stream commands over /ws, where each
+# command is acknowledged and the car state is pushed every STATE_INTERVAL seconds.
+class Gateway:
+    def __init__(self, host, port=80, poll_state=False):
+        self.car_client = CarClient(host, port=port, verbose=False)
+        self.scheduler = CommandScheduler(self.car_client.control)
+        self.poll_state = poll_state  # Also read /state from the car (car_sim.py serves it)
+        self.sockets = set()
+        self.seq = 0
+
+    def submit(self, cmd, speed):
+        cmd, speed = parse_command(cmd, speed)
+        if cmd == "stop":
+            self.scheduler.send_now(cmd, speed)  # Never delay a stop
+        else:
+            self.scheduler.submit(cmd, speed)
+        self.seq += 1
+        return {"type": "ack", "seq": self.seq, "cmd": cmd, "speed": speed}
+
+    async def index(self, request):
+        return web.FileResponse(INDEX_PATH)
+
+    async def control(self, request):
+        try:
+            ack = self.submit(request.query.get("cmd"), request.query.get("speed", 0))
+        except ValueError as e:
+            return web.json_response({"type": "error", "error": str(e)}, status=400)
+        return web.json_response(ack)
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=10.0)
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                data = None
+                try:
+                    data = json.loads(message.data)
+                    reply = self.submit(data.get("cmd"), data.get("speed", 0))
+                except (ValueError, TypeError, AttributeError) as e:
+                    reply = {"type": "error", "error": str(e)}
+                if isinstance(data, dict) and "id" in data:
+                    reply["id"] = data["id"]  # Lets the page match acks to its commands
+                await ws.send_json(reply)
+        finally:
+            self.sockets.discard(ws)
+        return ws
+
+    # Car state from /state, read through the car client's sender like the commands
+    async def _car_state(self):
+        response = await asyncio.wrap_future(self.car_client.fetch("/state"))
+        if response is None or response.status_code != 200:
+            return None
+        return response.json()
+
+    async def state(self):
+        last = self.scheduler.last_sent
+        state = {
+            "type": "state",
+            "command": last[0] if last else None,
+            "speed": last[1] if last else None,
+            "clients": len(self.sockets),
+            "commands": self.scheduler.stats(),
+            "errors": self.car_client.errors,
+        }
+        if self.poll_state:
+            state["car"] = await self._car_state()
+        return state
+
+    # Push the current state to every WebSocket client
+    async def broadcast_state(self, app):
+        while True:
+            await asyncio.sleep(STATE_INTERVAL)
+            if not self.sockets:
+                continue
+            state = await self.state()
+            for ws in list(self.sockets):
+                try:
+                    await ws.send_json(state)
+                except ConnectionError:
+                    self.sockets.discard(ws)
+
+    async def start_background(self, app):
+        app["state_task"] = asyncio.create_task(self.broadcast_state(app))
+
+    async def cleanup(self, app):
+        app["state_task"].cancel()
+        for ws in list(self.sockets):
+            await ws.close()
+        self.scheduler.send_now("stop", 0)
+        self.scheduler.close()
+        self.car_client.close()
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get("/", self.index)
+        app.router.add_get("/control", self.control)
+        app.router.add_get("/ws", self.websocket)
+        app.on_startup.append(self.start_background)
+        app.on_cleanup.append(self.cleanup)
+        return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve templates/index.html and forward its commands to the car")
+    parser.add_argument("--car", default=ESP32_IP, help="Car host, optionally host:port")
+    parser.add_argument("--port", type=int, default=GATEWAY_PORT)
+    parser.add_argument("--poll-state", action="store_true", help="Include the car's /state in state updates")
+    args = parser.parse_args()
+
+    host, _, port = args.car.partition(":")
+    gateway = Gateway(host, int(port or 80), args.poll_state)
+    web.run_app(gateway.make_app(), port=args.port)
@@ -1,6 +1,5 @@
 import cv2
 import numpy as np
-import requests
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
@@ -10,29 +9,48 @@ from kivy.uix.label import Label
 from kivy.uix.image import Image
 from kivy.graphics.texture import Texture
 from kivy.clock import Clock
-from threading import Thread
-from pyzbar.pyzbar import decode
+import time
+from threading import Event, Thread
 from kivy.uix.screenmanager import ScreenManager, Screen
+from car_client import CarClient
+from command_scheduler import CommandScheduler
+from capture import FrameGrabber, PipelineStage
+from qr_tracker import QRTracker
+from frame_context import FrameContextPool
+from detectors import DETECTOR, make_detector
+from metrics import metrics
 
 
 # Default values
 ESP32_IP = "esp32-car.local"  # Default IP address, can be changed via the UI
-ESP32_URL = f"http://{ESP32_IP}:80/control"  # URL endpoint for car control
+ROI_TRACKING = True  # Decode only around the last known QR positions between full scans
+DISPLAY_FPS = 30  # Camera view refresh rate on the UI thread, independent of the processing rate
+METRICS_PORT = 9902  # Local Prometheus endpoint with per-stage latencies (0 = off)
+car_client = CarClient(ESP32_IP, port=80)  # Shared, non-blocking connection to the car
 
 
-# Function to send commands to the ESP32
+# Function to send commands to the ESP32 (queued, never blocks the camera thread or the UI)
 def send_car_command(command, speed):
-    try:
-        url = f"{ESP32_URL}?cmd={command}&speed={speed}"
-        response = requests.get(url)
-        print(f"Sent command: {command}, Speed: {speed}")
-    except Exception as e:
-        print(f"Error sending command: {e}")
+    car_client.control(command, speed)
 
 
-# QR code tracking function
-def track_qr_codes(frame):
-    decoded_objects = decode(frame)
+# Tracking commands go out only when they change, rate-limited, with a periodic keepalive.
+# Manual buttons use send_now so the keepalive repeats the button the user pressed.
+command_scheduler = CommandScheduler(send_car_command)
+
+
+# Incremental tracker used when ROI_TRACKING is enabled
+marker_detector = make_detector(DETECTOR)  # Marker detector backend (pyzbar, opencv or aruco), see detectors.py
+qr_tracker = QRTracker(labels=("car", "target"), decoder=marker_detector, roi_decoder=marker_detector)
+frame_contexts = FrameContextPool()  # Reused grayscale buffers for detection
+
+
+# QR code tracking function (on a FrameContext, see frame_context.py)
+def track_qr_codes(context):
+    if ROI_TRACKING:
+        return qr_tracker.track(context)
+
+    decoded_objects = marker_detector(context.gray)
     car_qr, target_qr = None, None
     for obj in decoded_objects:
         data = obj.data.decode("utf-8")
@@ -98,22 +116,22 @@ class MainScreen(Screen):
 
     def move_forward(self, instance):
         speed = int(self.speed_slider.value)
-        send_car_command("forward", speed)
+        command_scheduler.send_now("forward", speed)
 
     def move_left(self, instance):
         speed = int(self.speed_slider.value)
-        send_car_command("left", speed)
+        command_scheduler.send_now("left", speed)
 
     def move_right(self, instance):
         speed = int(self.speed_slider.value)
-        send_car_command("right", speed)
+        command_scheduler.send_now("right", speed)
 
     def move_backward(self, instance):
         speed = int(self.speed_slider.value)
-        send_car_command("backward", speed)
+        command_scheduler.send_now("backward", speed)
 
     def stop_car(self, instance):
-        send_car_command("stop", 0)
+        command_scheduler.send_now("stop", 0)
 
     def switch_camera(self, instance):
         """Switch between front and back camera"""
@@ -125,7 +143,10 @@ class MainScreen(Screen):
             self.camera_switch_button.text = "Switch to Back Camera"
 
 
-# Tracking Screen with camera feed and QR code tracking
+# Tracking Screen with camera feed and QR code tracking.
+# The camera and decoder only run while the screen is shown (on_enter/on_leave).
+# The processing thread just publishes its newest frame; the UI thread copies it
+# into one reused BGR texture at DISPLAY_FPS, so Kivy is only touched from the main thread.
 class TrackingScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -139,30 +160,81 @@ class TrackingScreen(Screen):
         back_button = Button(text="Back to Manual", size_hint=(1, 0.1), on_press=self.switch_to_manual)
         self.layout.add_widget(back_button)
 
-        # Start camera processing in a separate thread
-        self.camera_thread = Thread(target=self.process_camera_feed)
-        self.camera_thread.daemon = True
-        self.camera_thread.start()
-
         self.add_widget(self.layout)
 
+        self.camera_thread = None
+        self._stopped = Event()  # Set when the current tracking session ends
+        self._blit_event = None
+        self._texture = None
+        self._frame = None  # (sequence number, BGR frame) published by the processing thread
+        self._shown_seq = None
+
     def switch_to_manual(self, instance):
         self.manager.current = 'manual'
 
-    def process_camera_feed(self):
-        cap = cv2.VideoCapture(0)  # Use the default front camera
-        if not cap.isOpened():
+    def on_enter(self):
+        # Each session has its own stop event; the new thread waits for the previous one
+        # itself, so the UI thread never blocks on it
+        self._stopped = Event()
+        self._shown_seq = None
+        self.camera_thread = Thread(target=self.process_camera_feed, args=(self._stopped, self.camera_thread))
+        self.camera_thread.daemon = True
+        self.camera_thread.start()
+        self._blit_event = Clock.schedule_interval(self.update_texture, 1.0 / DISPLAY_FPS)
+
+    def on_leave(self):
+        self._stopped.set()
+        if self._blit_event is not None:
+            self._blit_event.cancel()
+        command_scheduler.send_now("stop", 0)  # Tracking no longer drives the car
+
+    # Copy the newest frame into the texture (main thread; skipped when no new frame arrived)
+    def update_texture(self, dt):
+        latest = self._frame
+        if latest is None or latest[0] == self._shown_seq:
+            return
+        seq, frame = latest
+        height, width = frame.shape[:2]
+        with metrics.timer("display"):
+            if self._texture is None or self._texture.size != (width, height):
+                self._texture = Texture.create(size=(width, height), colorfmt='bgr')
+                self._texture.flip_vertical()  # OpenCV rows run top to bottom
+                self.camera_image.texture = self._texture
+            self._texture.blit_buffer(frame, colorfmt='bgr', bufferfmt='ubyte')
+            self.camera_image.canvas.ask_update()
+        self._shown_seq = seq
+
+    # Decode stage: returns the frame together with its detections
+    def decode_frame(self, frame):
+        context = frame_contexts.acquire(frame)  # Grayscale view in a buffer reused across frames
+        car_qr, target_qr = track_qr_codes(context)
+        context.release()
+        return frame, car_qr, target_qr
+
+    def process_camera_feed(self, stopped, previous=None):
+        if previous is not None:
+            previous.join()  # Let the previous session release the camera
+        if stopped.is_set():
+            return
+
+        # Capture and decode run on their own threads; this loop only sees the newest decoded frame
+        grabber = FrameGrabber(0)  # Use the default front camera
+        if not grabber.isOpened():
             print("Unable to access the camera.")
             return
+        grabber.start()
+        decoder = PipelineStage("decode", grabber.buffer, self.decode_frame).start()
+        metrics.watch_buffers(grabber.buffer, decoder.output)
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Failed to grab frame from the camera.")
-                break
+        while not stopped.is_set():
+            result = decoder.output.get(timeout=0.2)
+            if result is None:
+                if decoder.output.closed:
+                    break
+                continue
 
             # QR code tracking logic
-            car_qr, target_qr = track_qr_codes(frame)
+            frame, car_qr, target_qr = result.data
             if car_qr and target_qr:
                 car_center = car_qr.rect
                 target_center = target_qr.rect
@@ -172,27 +244,31 @@ class TrackingScreen(Screen):
                 # Control the car based on distance
                 speed = calculate_speed(distance)
                 if distance > 100:
-                    send_car_command("forward", speed)
+                    command_scheduler.submit("forward", speed)
                 else:
-                    send_car_command("stop", 0)
+                    command_scheduler.submit("stop", 0)
             else:
-                send_car_command("stop", 0)
+                command_scheduler.submit("stop", 0)
 
-            # Convert the frame to texture for Kivy Image widget
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='rgb')
-            texture.blit_buffer(frame.tobytes(), colorfmt='rgb', bufferfmt='ubyte')
-            self.camera_image.texture = texture
+            # Time from capture to the control decision for this frame
+            metrics.observe("frame_latency", time.monotonic() - result.timestamp)
 
-            # Sleep for a short time to prevent high CPU usage
-            cv2.waitKey(1)
+            # Hand the frame to the UI thread (no colour conversion, the texture is BGR)
+            self._frame = (result.seq, frame)
 
-        cap.release()
+        # The last iteration may have submitted a command after on_leave's stop; the loop has
+        # ended now, so this stop is the final word from tracking
+        command_scheduler.send_now("stop", 0)
+        decoder.stop()
+        grabber.stop()
+        self._frame = None
 
 
 # CarControlApp to manage screens
 class CarControlApp(App):
     def build(self):
+        if METRICS_PORT:
+            metrics.serve(METRICS_PORT)
         self.screen_manager = ScreenManager()
 
         self.main_screen = MainScreen(name="manual")
@@ -1,58 +1,113 @@
+import argparse
 import cv2
 import numpy as np
-from pyzbar.pyzbar import decode
-from queue import PriorityQueue
+import heapq
+import time
+from capture import FrameGrabber, PipelineStage, pipeline_stats
+from qr_tracker import QRTracker
+from detectors import DETECTOR, make_detector
+from decode_pool import DecodePool
+from dstar_lite import IncrementalPlanner
+from flow_field import FlowField
+from occupancy import OccupancyGrid, edge_image
+from frame_context import FrameContext, FrameContextPool
+from calibration import load_calibration, marker_centers
+from car_client import CarClient
+from path_follower import PathFollower
+from metrics import metrics
+from mjpeg import MJPEG_PORT, MjpegServer
+
+CELL_SIZE = 10  # Camera pixels per maze cell
+CALIBRATED_MAZE = True  # Plan on the top-down floor view when calibration.npz exists (see calibration.py)
+WORLD_CELL = 5.0  # World units (cm) per maze cell on the calibrated grid
+DIAGONAL_MOVES = False  # Plan on an 8-connected grid instead of a 4-connected one
+INCREMENTAL_PLANNING = True  # Repair the previous plan between frames instead of re-running A*
+FLOW_FIELD = False  # Route with a flow field from the target (4-connected; best when the target stays put)
+ROI_TRACKING = True  # Decode only around the last known QR positions between full scans
+DECODE_WORKERS = 0  # Worker processes for full-frame pyzbar scans (0 = decode on the tracking thread)
+LIVE_MAZE = True  # Build the maze from the camera's edge image instead of using an empty grid
+METRICS_PORT = 9901  # Local Prometheus endpoint with per-stage latencies (0 = off)
+METRICS_CSV = None  # File to append a metrics snapshot to every 10 seconds (None = off)
+HEADLESS = False  # No windows: serve the three views as MJPEG on MJPEG_PORT instead
+PATH_FOLLOWING = False  # Drive the car along the planned path with batched /plan requests (see path_follower.py)
+CAR_HOST = "esp32-car.local"  # Car that receives the plans when PATH_FOLLOWING is enabled
+marker_detector = make_detector(DETECTOR)  # Marker detector backend (pyzbar, opencv or aruco), see detectors.py
+qr_tracker = QRTracker(labels=("car", "target"), decoder=marker_detector, roi_decoder=marker_detector)
+frame_contexts = FrameContextPool()  # Per-frame gray/edge views shared by detection, maze extraction and display
+
+# Moves (row step, column step, cost) for 4- and 8-connected grids
+SQRT2 = 2 ** 0.5
+MOVES_4 = ((-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0))
+MOVES_8 = MOVES_4 + ((-1, -1, SQRT2), (-1, 1, SQRT2), (1, -1, SQRT2), (1, 1, SQRT2))
 
 # A* Pathfinding
-def astar(maze, start, end):
+# Cells are flat indices (row * cols + col) into NumPy arrays for scores and parents,
+# the open set is a plain heapq, and stale heap entries are skipped via the closed set.
+# With diagonal=True the car may also move diagonally (never cutting a wall corner).
+def astar(maze, start, end, diagonal=False):
     rows, cols = maze.shape
-    open_set = PriorityQueue()
-    open_set.put((0, start))
-    came_from = {}
-    g_score = {start: 0}
-    f_score = {start: heuristic(start, end)}
+    if not (0 <= start[0] < rows and 0 <= start[1] < cols and 0 <= end[0] < rows and 0 <= end[1] < cols):
+        return []  # Off the grid (e.g. a marker outside the mapped area)
+    walls = (maze == 1).ravel()
+    g_score = np.full(rows * cols, np.inf)
+    came_from = np.full(rows * cols, -1, dtype=np.int64)
+    closed = np.zeros(rows * cols, dtype=bool)
+    moves = MOVES_8 if diagonal else MOVES_4
+    end_row, end_col = end
+
+    def heuristic(row, col):
+        dr, dc = abs(row - end_row), abs(col - end_col)
+        if diagonal:
+            return dr + dc + (SQRT2 - 2) * min(dr, dc)  # Octile distance
+        return dr + dc  # Manhattan distance
+
+    start_index = start[0] * cols + start[1]
+    end_index = end_row * cols + end_col
+    g_score[start_index] = 0
+    open_set = [(heuristic(*start), start_index)]
 
-    while not open_set.empty():
-        _, current = open_set.get()
+    while open_set:
+        _, current = heapq.heappop(open_set)
 
-        if current == end:
-            return reconstruct_path(came_from, current)
+        if current == end_index:
+            return reconstruct_path(came_from, current, cols)
+        if closed[current]:
+            continue  # Stale entry, the cell was already expanded with a lower score
+        closed[current] = True
 
-        neighbors = get_neighbors(current, rows, cols)
-        for neighbor in neighbors:
-            if maze[neighbor] == 1:  # Wall
+        row, col = divmod(current, cols)
+        current_g = g_score[current]
+        for dr, dc, cost in moves:
+            r, c = row + dr, col + dc
+            if not (0 <= r < rows and 0 <= c < cols):
                 continue
-            tentative_g_score = g_score[current] + 1
-            if tentative_g_score < g_score.get(neighbor, float('inf')):
+            neighbor = r * cols + c
+            if walls[neighbor] or closed[neighbor]:  # Wall or done
+                continue
+            if dr and dc and (walls[row * cols + c] or walls[r * cols + col]):
+                continue  # Diagonal move would cut a wall corner
+            tentative_g_score = current_g + cost
+            if tentative_g_score < g_score[neighbor]:
                 came_from[neighbor] = current
                 g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = tentative_g_score + heuristic(neighbor, end)
-                open_set.put((f_score[neighbor], neighbor))
+                heapq.heappush(open_set, (tentative_g_score + heuristic(r, c), neighbor))
 
     return []  # No path found
 
-def heuristic(a, b):
-    return abs(a[0] - b[0]) + abs(a[1] - b[1])
-
-def reconstruct_path(came_from, current):
-    path = [current]
-    while current in came_from:
+def reconstruct_path(came_from, current, cols):
+    path = []
+    while current != -1:
+        path.append(divmod(int(current), cols))
         current = came_from[current]
-        path.append(current)
     path.reverse()
     return path
 
-def get_neighbors(node, rows, cols):
-    neighbors = []
-    for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-        x, y = node[0] + dx, node[1] + dy
-        if 0 <= x < rows and 0 <= y < cols:
-            neighbors.append((x, y))
-    return neighbors
-
-# QR Code Detection
-def detect_qr_codes(frame):
-    decoded_objects = decode(frame)
+# QR Code Detection (on a FrameContext, so the grayscale view is shared with the maze stages)
+def detect_qr_codes(context):
+    if ROI_TRACKING:
+        return qr_tracker.track(context)
+
+    decoded_objects = marker_detector(context.gray)
     car_qr, target_qr = None, None
     for obj in decoded_objects:
         data = obj.data.decode("utf-8")
@@ -63,72 +118,273 @@ def detect_qr_codes(frame):
     return car_qr, target_qr
 
 # Process Frame
-def process_frame(frame, maze, car_position, target_position):
-    bw_view = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    bw_view = cv2.Canny(bw_view, 50, 150)
+# `planner` is an optional IncrementalPlanner, FlowField or any callable with astar's signature;
+# `edges` is the frame's edge image if it was already computed for the occupancy grid;
+# `out` is an optional preallocated BGR image the annotated view is drawn into, and
+# `walls_out` an optional preallocated uint8 buffer (maze shape * cell_size) for the wall mask
+def process_frame(frame, maze, car_position, target_position, planner=None, edges=None, cell_size=CELL_SIZE,
+                  out=None, walls_out=None):
+    bw_view = edges if edges is not None else edge_image(frame)
 
-    walls = maze == 1
-    path = astar(maze, car_position, target_position)
+    with metrics.timer("plan"):
+        if planner is not None:
+            path = planner(maze, car_position, target_position)
+        else:
+            path = astar(maze, car_position, target_position, diagonal=DIAGONAL_MOVES)
 
-    # Highlight maze walls and path in black-and-white view
-    color_bw_view = cv2.cvtColor(bw_view, cv2.COLOR_GRAY2BGR)
-    color_bw_view[walls] = [255, 0, 0]  # Blue for walls
+    # Highlight maze walls and path in black-and-white view (one maze cell = cell_size pixels)
+    color_bw_view = cv2.cvtColor(bw_view, cv2.COLOR_GRAY2BGR, dst=out)
+    rows, cols = maze.shape
+    walls = cv2.resize((maze == 1).view(np.uint8), (cols * cell_size, rows * cell_size), dst=walls_out,
+                       interpolation=cv2.INTER_NEAREST_EXACT)  # Each cell as a cell_size block
+    h, w = min(walls.shape[0], color_bw_view.shape[0]), min(walls.shape[1], color_bw_view.shape[1])
+    view, mask = color_bw_view[:h, :w], walls[:h, :w]
+    cv2.subtract(view, (255, 255, 255, 0), dst=view, mask=mask)  # Blue for walls: clear, then set blue
+    cv2.add(view, (255, 0, 0, 0), dst=view, mask=mask)
     for x, y in path:
-        color_bw_view[x, y] = [255, 255, 255]  # White for path
+        color_bw_view[x * cell_size:(x + 1) * cell_size, y * cell_size:(y + 1) * cell_size] = [255, 255, 255]  # White for path
 
     return color_bw_view, path
 
+# Mini-map colours (BGR), indexed by cell value: free, wall
+MINI_MAP_COLORS = np.array([[0, 0, 0], [0, 0, 255]], dtype=np.uint8)
+MINI_MAP_CELL = 10  # Mini-map pixels per maze cell
+
+# Mini-map renderer.
+# The maze layer is rasterized in one vectorized step (colour lookup + repeat) and
+# cached. The maze is not compared every frame: whoever changes it reports the changed
+# cells with update_cells() (or calls invalidate() to redraw it all), and a maze of a
+# new shape is rasterized from scratch. Each frame only the areas covered by the previous
+# overlays are restored from the cache before the path, car and target are drawn,
+# so the per-frame cost depends on the path length, not on the grid area.
+# The returned image is reused between calls.
+class MiniMapRenderer:
+    def __init__(self, cell=MINI_MAP_CELL):
+        self.cell = cell
+        self._maze = None
+        self._background = None
+        self._canvas = None
+        self._dirty = []  # (x0, y0, x1, y1) areas drawn over in the last frame
+
+    def _rasterize(self, maze):
+        cell = self.cell
+        grid = MINI_MAP_COLORS[(maze != 0).astype(np.uint8)]
+        self._background = np.repeat(np.repeat(grid, cell, axis=0), cell, axis=1)
+        self._canvas = self._background.copy()
+        self._maze = maze.copy()
+        self._dirty = []
+
+    # Repaint only the given cells of the cached maze layer (e.g. from an occupancy grid update)
+    def update_cells(self, maze, cells):
+        if self._maze is None or maze.shape != self._maze.shape:
+            self._rasterize(maze)
+            return
+        cell = self.cell
+        for x, y in cells:
+            self._maze[x, y] = maze[x, y]
+            block = (slice(x * cell, (x + 1) * cell), slice(y * cell, (y + 1) * cell))
+            self._background[block] = MINI_MAP_COLORS[int(maze[x, y] != 0)]
+            self._canvas[block] = self._background[block]
+
+    # Rasterize the whole maze again on the next render
+    def invalidate(self):
+        self._maze = None
+
+    def _mark(self, x0, y0, x1, y1):
+        height, width = self._canvas.shape[:2]
+        self._dirty.append((max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)))
+
+    def _label(self, text, position, color):
+        cell = self.cell
+        org = (position[1] * cell, position[0] * cell)
+        (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+        cv2.putText(self._canvas, text, org, cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        self._mark(org[0] - 2, org[1] - h - 2, org[0] + w + 2, org[1] + baseline + 2)
+
+    def render(self, maze, car_position, target_position, path):
+        if self._maze is None or maze.shape != self._maze.shape:
+            self._rasterize(maze)
+
+        # Restore what the previous overlays covered
+        for x0, y0, x1, y1 in self._dirty:
+            self._canvas[y0:y1, x0:x1] = self._background[y0:y1, x0:x1]
+        self._dirty = []
+
+        # Draw path
+        cell = self.cell
+        for x, y in path:
+            cv2.circle(self._canvas, (y * cell + cell // 2, x * cell + cell // 2), 3, (255, 255, 255), -1)
+            self._mark(y * cell, x * cell, (y + 1) * cell, (x + 1) * cell)
+
+        # Draw car and target
+        self._label("🚗", car_position, (0, 255, 0))
+        self._label("🏁", target_position, (0, 255, 255))
+
+        return self._canvas
+
+mini_map_renderer = MiniMapRenderer()
+
 # Draw Mini-Map
 def draw_mini_map(maze, car_position, target_position, path):
-    mini_map = np.zeros((maze.shape[0] * 10, maze.shape[1] * 10, 3), dtype=np.uint8)
-    for x in range(maze.shape[0]):
-        for y in range(maze.shape[1]):
-            color = (0, 0, 0) if maze[x, y] == 0 else (0, 0, 255)
-            cv2.rectangle(mini_map, (y * 10, x * 10), ((y + 1) * 10, (x + 1) * 10), color, -1)
+    return mini_map_renderer.render(maze, car_position, target_position, path)
 
-    # Draw path
-    for x, y in path:
-        cv2.circle(mini_map, (y * 10 + 5, x * 10 + 5), 3, (255, 255, 255), -1)
+# Detection stage of the pipeline: returns the frame's context (its shared views) together
+# with its detections; the main loop releases the context when it is done with the frame
+def detect_frame(frame):
+    context = frame_contexts.acquire(frame)
+    car_qr, target_qr = detect_qr_codes(context)
+    return context, car_qr, target_qr
 
-    # Draw car and target
-    car_x, car_y = car_position
-    target_x, target_y = target_position
-    cv2.putText(mini_map, "🚗", (car_y * 10, car_x * 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-    cv2.putText(mini_map, "🏁", (target_y * 10, target_x * 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+# Main Loop
+# With headless=True no GUI is used; stop with Ctrl+C.
+def main(headless=HEADLESS):
+    grabber = FrameGrabber(0)
+    if not grabber.isOpened():
+        return
 
-    return mini_map
+    # Spread full-frame scans over a process pool (useful for 1080p cameras)
+    # (the pool decodes with pyzbar, so it is only used with that backend)
+    decode_pool = DecodePool(DECODE_WORKERS) if DECODE_WORKERS and DETECTOR == "pyzbar" else None
+    if decode_pool:
+        qr_tracker.decoder = decode_pool.decode
 
-# Main Loop
-def main():
-    cap = cv2.VideoCapture(0)
-    maze = np.zeros((20, 20), dtype=np.uint8)  # Example empty maze
+    grabber.start()
+    detector = PipelineStage("detect", grabber.buffer, detect_frame).start()
+
+    # Per-stage latency histograms and dropped-frame counters
+    metrics.watch_buffers(grabber.buffer, detector.output)
+    metrics_server = metrics.serve(METRICS_PORT) if METRICS_PORT else None
+    if METRICS_CSV:
+        metrics.dump_csv(METRICS_CSV)
+    mjpeg_server = MjpegServer(MJPEG_PORT) if headless else None
+
+    maze = np.zeros((20, 20), dtype=np.uint8)  # Example empty maze (replaced by the live grid)
+    cell_size = CELL_SIZE
+    calibration = load_calibration() if CALIBRATED_MAZE else None
+    top_down = None  # Reused top-down view buffer
+    top_down_views = FrameContext()  # Gray/edge views of the top-down image, reused every frame
+    if calibration:
+        # Cells are WORLD_CELL units of floor wherever they are in the image, so the grid is
+        # smaller than the pixel grid and distances on it are metric
+        cell_size = max(int(round(WORLD_CELL * calibration.view_scale)), 1)
+        view_width, view_height = calibration.view_size
+        maze = np.zeros((view_height // cell_size, view_width // cell_size), dtype=np.uint8)
+    occupancy = OccupancyGrid(cell_size) if LIVE_MAZE else None
+    if FLOW_FIELD:
+        planner = FlowField()
+    elif INCREMENTAL_PLANNING:
+        planner = IncrementalPlanner(diagonal=DIAGONAL_MOVES)
+    else:
+        planner = None
     car_position = (10, 10)
     target_position = (5, 5)
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    # Plans are in car distance units: cm on the calibrated grid, camera pixels otherwise
+    car_client = CarClient(CAR_HOST, verbose=False) if PATH_FOLLOWING else None
+    follower = PathFollower(car_client.plan, cell_length=WORLD_CELL if calibration else CELL_SIZE) if car_client else None
+
+    context = None
+    try:
+        while True:
+            result = detector.output.get(timeout=1.0)
+            if result is None:
+                if detector.output.closed:
+                    break
+                continue
+
+            if context is not None:
+                context.release()  # The previous frame is off screen: its buffers can be reused
+            context, car_qr, target_qr = result.data
+            frame = context.frame
+            views = context  # Views of the image the maze is extracted from
+            if calibration:
+                # Warp to the top-down view and map both marker centres onto its grid in one call
+                with metrics.timer("warp"):
+                    top_down = calibration.warp(frame, dst=top_down)
+                    views = top_down_views.reset(top_down)
+                seen = [qr for qr in (car_qr, target_qr) if qr]
+                cells = iter(calibration.to_cells(marker_centers(seen), cell_size, maze.shape)) if seen else None
+                if car_qr:
+                    car_position = tuple(int(v) for v in next(cells))
+                if target_qr:
+                    target_position = tuple(int(v) for v in next(cells))
+            else:
+                if car_qr:
+                    car_position = (int(car_qr.rect.top // CELL_SIZE), int(car_qr.rect.left // CELL_SIZE))
+                if target_qr:
+                    target_position = (int(target_qr.rect.top // CELL_SIZE), int(target_qr.rect.left // CELL_SIZE))
+
+            view = views.frame
+            if occupancy:
+                with metrics.timer("occupancy"):
+                    edges = views.edges()
+                    if calibration:
+                        markers = [calibration.view_rect(qr) for qr in (car_qr, target_qr) if qr]
+                    else:
+                        markers = [qr.rect for qr in (car_qr, target_qr) if qr]
+                    maze, changed = occupancy.update(edges, markers)
+                if len(changed):
+                    # Only the changed cells are repaired in the plan and repainted on the mini-map
+                    if planner:
+                        planner.update_cells(maze, changed)
+                    mini_map_renderer.update_cells(maze, changed)
+
+            walls = views.buffer("walls", (maze.shape[0] * cell_size, maze.shape[1] * cell_size))
+            bw_view, path = process_frame(view, maze, car_position, target_position, planner, views.edges(), cell_size,
+                                          out=views.buffer("bw_view", view.shape), walls_out=walls)
+            if follower and car_qr:
+                # Only sends a plan when the car is off the route, the target moved or a batch is done
+                follower.maze = maze
+                try:
+                    follower.update(path, car_position)
+                except RuntimeError as e:
+                    # The firmware has no /plan route: stop following and stop the car with a direct command
+                    print(f"Path following disabled: {e}")
+                    car_client.send("/stop")
+                    follower = None
 
-        car_qr, target_qr = detect_qr_codes(frame)
-        if car_qr:
-            car_position = (int(car_qr.rect.top // 10), int(car_qr.rect.left // 10))
-        if target_qr:
-            target_position = (int(target_qr.rect.top // 10), int(target_qr.rect.left // 10))
+            with metrics.timer("mini_map"):
+                mini_map = draw_mini_map(maze, car_position, target_position, path)
 
-        bw_view, path = process_frame(frame, maze, car_position, target_position)
-        mini_map = draw_mini_map(maze, car_position, target_position, path)
+            # Time from capture to a planned path for this frame
+            metrics.observe("frame_latency", time.monotonic() - result.timestamp)
 
-        # Display views
-        cv2.imshow("Top-to-Bottom View", frame)
-        cv2.imshow("Black-and-White View", bw_view)
-        cv2.imshow("Mini-Map", mini_map)
+            # Display views (headless: offer them to MJPEG viewers, encoded only if someone watches)
+            with metrics.timer("display"):
+                if headless:
+                    mjpeg_server.publish("camera", view)
+                    mjpeg_server.publish("edges", bw_view)
+                    mjpeg_server.publish("mini_map", mini_map)
+                    continue
+                cv2.imshow("Top-to-Bottom View", view)
+                cv2.imshow("Black-and-White View", bw_view)
+                cv2.imshow("Mini-Map", mini_map)
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
 
-    cap.release()
-    cv2.destroyAllWindows()
+    if car_client:
+        if follower:
+            car_client.plan([], 0)  # Stop the car before exiting
+            print(f"Path following: {follower.stats()}")
+        car_client.close()
+    detector.stop()
+    grabber.stop()
+    if decode_pool:
+        decode_pool.close()
+    print(f"Pipeline stats: {pipeline_stats(grabber.buffer, detector.output)}")
+    if metrics_server:
+        metrics_server.shutdown()
+    if mjpeg_server:
+        mjpeg_server.close()
+    else:
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Plan a path for the car through the maze seen by the camera")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS,
+                        help=f"No windows; stream the views on http://localhost:{MJPEG_PORT}/")
+    args = parser.parse_args()
+    main(headless=args.headless)
@@ -0,0 +1,183 @@
+import csv
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default metrics settings
+METRICS_PORT = 9900  # Local port of the Prometheus endpoint (9100 is node_exporter's)
+PREFIX = "aicar_"  # Prefix of every exported metric name
+MIN_VALUE = 1e-6  # Smallest value a histogram resolves (seconds)
+MAX_VALUE = 100.0  # Values above this land in the last bucket
+GROWTH = 1.05  # Bucket width ratio: quantiles are accurate to about +-2.5%
+QUANTILES = (0.5, 0.95, 0.99)
+
+_LOG_GROWTH = math.log(GROWTH)
+_BUCKETS = int(math.log(MAX_VALUE / MIN_VALUE) / _LOG_GROWTH) + 2
+
+
+# Streaming histogram with logarithmic buckets.
+# Memory and the cost of observe() are constant no matter how many samples arrive,
+# so it can stay on in production; quantiles are read back from the bucket counts.
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if value <= MIN_VALUE:
+            index = 0
+        else:
+            index = min(int(math.log(value / MIN_VALUE) / _LOG_GROWTH) + 1, _BUCKETS - 1)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    # Value below which a fraction `q` of the samples fall (bucket midpoint), or None if empty
+    def quantile(self, q):
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    break
+        if index == 0:
+            return MIN_VALUE
+        return MIN_VALUE * GROWTH ** (index - 0.5)
+
+
+# Times the enclosed block and records it in a histogram
+class Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+# Named histograms, counters and gauges shared by the whole process
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}  # name -> callable returning the current value
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    # with metrics.timer("decode"): ...  records the duration in seconds
+    def timer(self, name):
+        return Timer(self.histogram(name))
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, func):
+        self.gauges[name] = func
+
+    # Expose the dropped-frame counters of pipeline buffers (capture.FrameBuffer)
+    def watch_buffers(self, *buffers):
+        for buffer in buffers:
+            self.gauge(f"{buffer.name}_frames_dropped", lambda b=buffer: b.dropped)
+            self.gauge(f"{buffer.name}_frames", lambda b=buffer: b.put_count)
+
+    # Current values as flat rows: (name, count, sum, p50, p95, p99) for histograms, (name, value) otherwise
+    def snapshot(self):
+        rows = []
+        for name, histogram in list(self.histograms.items()):
+            rows.append((name, histogram.count, histogram.sum) + tuple(histogram.quantile(q) for q in QUANTILES))
+        for name, value in list(self.counters.items()):
+            rows.append((name, value))
+        for name, func in list(self.gauges.items()):
+            rows.append((name, func()))
+        return rows
+
+    # Prometheus text exposition format (histograms are exported as summaries)
+    def render(self):
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                lines.append(f'{metric}{{quantile="{q}"}} {value if value is not None else "NaN"}')
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {PREFIX}{name}_total counter")
+            lines.append(f"{PREFIX}{name}_total {value}")
+        for name, func in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {func()}")
+        return "\n".join(lines) + "\n"
+
+    # Serve /metrics on a background thread; returns the server
+    def serve(self, port=METRICS_PORT, host="127.0.0.1"):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"Metrics endpoint disabled, cannot listen on {host}:{port}: {e}")
+            return None  # The app runs on without it
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Metrics on http://{host}:{port}/metrics")
+        return server
+
+    # Append a snapshot to a CSV file every `interval` seconds on a background thread
+    def dump_csv(self, path, interval=10.0):
+        def run():
+            new_file = not os.path.exists(path)
+            while True:
+                time.sleep(interval)
+                now = time.time()
+                with open(path, "a", newline="") as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(["time", "name", "count_or_value", "sum"] + [f"p{int(q * 100)}" for q in QUANTILES])
+                        new_file = False
+                    for row in self.snapshot():
+                        writer.writerow((now,) + row)
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+# Process-wide registry used by the apps, the pipeline and the car client
+metrics = Metrics()
@@ -0,0 +1,163 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from metrics import metrics
+
+# Default streaming settings
+MJPEG_PORT = 8081  # Port of the MJPEG endpoint
+MJPEG_HOST = "0.0.0.0"  # Listen on all interfaces so the headless box can be watched from elsewhere
+JPEG_QUALITY = 80
+BOUNDARY = b"frame"
+
+
+# One named stream of annotated frames.
+# publish() only keeps a copy of the newest frame; a dedicated thread encodes
+# it to JPEG once and every connected viewer is sent the same bytes. Nothing is
+# encoded while nobody is watching. Viewers always get the newest JPEG when they
+# are ready for the next one, so a slow viewer skips frames instead of holding
+# up the encoder or the other viewers.
+class MjpegStream:
+    def __init__(self, name, quality=JPEG_QUALITY):
+        self.name = name
+        self.quality = quality
+        self.viewers = 0
+        self.encoded = 0
+        self.skipped = 0  # Frames a viewer never received because it was still busy
+        self._frame = None
+        self._frame_seq = 0
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def publish(self, frame):
+        with self._cond:
+            if not self.viewers:
+                return  # Nobody is watching: skip the frame entirely
+            self._frame = frame.copy()  # Callers may reuse their buffer (e.g. the mini-map canvas)
+            self._frame_seq += 1
+            self._cond.notify_all()
+
+    def _encode(self):
+        encoded_seq = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or self._frame_seq != encoded_seq)
+                if not self._running:
+                    return
+                frame, encoded_seq = self._frame, self._frame_seq
+                self._frame = None  # Drop the reference so the frame can be freed
+            with metrics.timer("mjpeg_encode"):
+                ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            with self._cond:
+                self._jpeg, self._jpeg_seq = jpeg.tobytes(), self._jpeg_seq + 1
+                self.encoded += 1
+                self._cond.notify_all()
+
+    # Wait for a JPEG newer than `seq`; returns (seq, jpeg) or None when closed or timed out
+    def wait(self, seq, timeout=5.0):
+        with self._cond:
+            if not self._cond.wait_for(
+                    lambda: not self._running or (self._jpeg is not None and self._jpeg_seq != seq), timeout):
+                return None
+            if not self._running:
+                return None
+            if seq and self._jpeg_seq > seq + 1:
+                self.skipped += self._jpeg_seq - seq - 1
+            return self._jpeg_seq, self._jpeg
+
+    @property
+    def closed(self):
+        return not self._running
+
+    def add_viewer(self):
+        with self._cond:
+            self.viewers += 1
+
+    def remove_viewer(self):
+        with self._cond:
+            self.viewers -= 1
+            if not self.viewers:
+                self._jpeg = None  # Next viewer should not see a stale frame
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+
+# HTTP server with one MJPEG stream per name: /stream/<name>, plus an index page at /
+class MjpegServer:
+    def __init__(self, port=MJPEG_PORT, host=MJPEG_HOST):
+        self.streams = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/":
+                    links = "".join(f'<h3>{name}</h3><img src="/stream/{name}">' for name in server.streams)
+                    body = f"<html><body>{links}</body></html>".encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                name = self.path[len("/stream/"):] if self.path.startswith("/stream/") else None
+                stream = server.streams.get(name)
+                if stream is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY.decode()}")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                self.send_frames(stream)
+
+            def send_frames(self, stream):
+                stream.add_viewer()
+                seq = 0
+                try:
+                    while True:
+                        item = stream.wait(seq)
+                        if item is None:
+                            if stream.closed:
+                                break
+                            continue
+                        seq, jpeg = item
+                        self.wfile.write(b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n"
+                                         b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Viewer went away
+                finally:
+                    stream.remove_viewer()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"MJPEG streams on http://{host}:{port}/")
+
+    def stream(self, name):
+        with self._lock:
+            if name not in self.streams:
+                self.streams[name] = MjpegStream(name)
+            return self.streams[name]
+
+    # Offer a frame to a named stream (cheap when nobody is watching)
+    def publish(self, name, frame):
+        self.stream(name).publish(frame)
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.close()
+        self._server.shutdown()
@@ -0,0 +1,109 @@
+import time
+
+from qr_tracker import transform_decoded
+
+# Default predictor settings
+ALPHA = 0.6  # Position correction gain
+BETA = 0.2  # Velocity correction gain
+DECODE_EVERY = 3  # Run the real decoder on every Nth frame
+MAX_RESIDUAL = 0.25  # Prediction error (fraction of marker size) that forces a decode next frame
+MAX_COAST = 0.3  # Seconds a marker may be predicted without a fresh measurement
+
+
+# Constant-velocity alpha-beta filter for one marker centre (pixels, pixels/second)
+class AlphaBetaFilter:
+    def __init__(self, x, y, timestamp, alpha=ALPHA, beta=BETA):
+        self.alpha = alpha
+        self.beta = beta
+        self.x, self.y = float(x), float(y)
+        self.vx = self.vy = 0.0
+        self.timestamp = timestamp
+        self.residual = 0.0  # Distance between the last prediction and measurement
+
+    def predict(self, timestamp):
+        dt = timestamp - self.timestamp
+        return self.x + self.vx * dt, self.y + self.vy * dt
+
+    def update(self, x, y, timestamp):
+        dt = timestamp - self.timestamp
+        px, py = self.predict(timestamp)
+        rx, ry = x - px, y - py
+        self.x, self.y = px + self.alpha * rx, py + self.alpha * ry
+        if dt > 0:
+            self.vx += self.beta * rx / dt
+            self.vy += self.beta * ry / dt
+        self.timestamp = timestamp
+        self.residual = (rx * rx + ry * ry) ** 0.5
+
+
+def _center(obj):
+    return obj.rect.left + obj.rect.width / 2, obj.rect.top + obj.rect.height / 2
+
+
+# Wraps a decoder such as track_qr_codes and only calls it every `decode_every` frames.
+# Between decodes each marker's position is predicted by its own alpha-beta filter;
+# measured positions are smoothed by the same filter. The decoder runs early when a
+# marker is missing, its last prediction error was large, or it has coasted too long.
+# Returns the same tuple of objects as the wrapped decoder, with rect/polygon moved
+# to the estimated position.
+class MarkerPredictor:
+    def __init__(self, decoder, decode_every=DECODE_EVERY, max_residual=MAX_RESIDUAL, max_coast=MAX_COAST):
+        self.decoder = decoder
+        self.decode_every = decode_every
+        self.max_residual = max_residual
+        self.max_coast = max_coast
+        self._filters = []
+        self._objects = None  # Last measured objects, in decoder order
+        self._since_decode = 0
+        self.decodes = 0
+        self.predictions = 0
+
+    # Whether the predictions can be trusted for this frame
+    def _confident(self, timestamp):
+        if self._objects is None or self._since_decode >= self.decode_every:
+            return False
+        for obj, filt in zip(self._objects, self._filters):
+            if obj is None:
+                return False
+            size = max(obj.rect.width, obj.rect.height, 1)
+            if filt.residual > self.max_residual * size or timestamp - filt.timestamp > self.max_coast:
+                return False
+        return True
+
+    # Move an object so its centre sits at the estimated position
+    @staticmethod
+    def _place(obj, x, y):
+        cx, cy = _center(obj)
+        return transform_decoded(obj, x - cx, y - cy)
+
+    # `timestamp` is the frame's capture time (time.monotonic()); the time of the call if not given
+    def track(self, frame, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        if self._confident(timestamp):
+            self._since_decode += 1
+            self.predictions += 1
+            return tuple(self._place(obj, *filt.predict(timestamp))
+                         for obj, filt in zip(self._objects, self._filters))
+
+        measured = self.decoder(frame)
+        self._since_decode = 1
+        self.decodes += 1
+        if self._objects is None:
+            self._filters = [None] * len(measured)
+
+        results = []
+        for i, obj in enumerate(measured):
+            if obj is None:
+                self._filters[i] = None
+                results.append(None)
+                continue
+            x, y = _center(obj)
+            if self._filters[i] is None:
+                self._filters[i] = AlphaBetaFilter(x, y, timestamp)
+            else:
+                self._filters[i].update(x, y, timestamp)
+            results.append(self._place(obj, self._filters[i].x, self._filters[i].y))
+        self._objects = list(measured)
+        return tuple(results)
@@ -0,0 +1,182 @@
+import argparse
+import json
+import multiprocessing
+import queue
+import time
+
+import cv2
+import numpy as np
+from pyzbar.locations import Point, Rect
+
+from car_client import CarClient
+from command_scheduler import CommandScheduler
+from metrics import metrics
+from qr_tracker import QRTracker, transform_decoded
+from steering import steering_command
+
+# Cameras: video source and the homography from its image to the shared world frame.
+# World units should match the distance thresholds in steering.py (MIN_DISTANCE etc.), e.g. by
+# using the first camera's image as the world frame. Overridden by --config.
+CAMERAS = [
+    {"source": 0, "homography": [[1, 0, 0], [0, 1, 0], [0, 0, 1]]},
+]
+LABELS = ("car", "target")
+CAR_HOST = "esp32-car.local"  # Car driven from the fused positions
+MAX_AGE = 0.25  # Seconds a camera's detection still counts towards the fused position
+RESULT_QUEUE_SIZE = 16  # Detections waiting for the fusion loop before workers start dropping them
+WORLD_VIEW_SIZE = (720, 1280)  # (height, width) of the fused top-down view
+
+
+# Load a camera list in the format of CAMERAS from a JSON file
+def load_cameras(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Map a decoded object's polygon into world coordinates; rect becomes the polygon's bounding box
+def to_world(obj, homography):
+    points = np.array(obj.polygon, dtype=np.float32).reshape(-1, 1, 2)
+    world = cv2.perspectiveTransform(points, homography).reshape(-1, 2)
+    left, top = world.min(axis=0)
+    right, bottom = world.max(axis=0)
+    polygon = [Point(int(round(x)), int(round(y))) for x, y in world]
+    rect = Rect(int(round(left)), int(round(top)), int(round(right - left)), int(round(bottom - top)))
+    return obj._replace(rect=rect, polygon=polygon)
+
+
+# Detection confidence: larger codes in the image are decoded from more pixels and locate
+# more precisely, so weight by image area (and by zbar's quality where it is reported)
+def detection_confidence(obj):
+    area = cv2.contourArea(np.array(obj.polygon, dtype=np.float32))
+    return max(area, 1.0) * max(obj.quality, 1)
+
+
+def _center(obj):
+    return np.mean(np.array(obj.polygon, dtype=np.float64), axis=0)
+
+
+# Worker process: capture and decode one camera, publishing world-frame detections.
+# Each camera has its own process (and its own ROI tracker), so decoding runs on all cores.
+def camera_worker(index, source, homography, results, stop):
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    if not cap.isOpened():
+        print(f"Unable to access camera {source}.")
+        return
+    homography = np.array(homography, dtype=np.float64)
+    tracker = QRTracker(labels=LABELS)
+
+    while not stop.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            print(f"Failed to grab frame from camera {source}.")
+            break
+        timestamp = time.monotonic()  # System-wide clock, comparable between processes
+        detections = {}
+        for label, obj in zip(LABELS, tracker.track(frame)):
+            if obj is not None:
+                detections[label] = (to_world(obj, homography), detection_confidence(obj))
+        try:
+            results.put_nowait((index, timestamp, detections))
+        except queue.Full:
+            pass  # Fusion loop is behind: newer detections will follow
+    cap.release()
+
+
+# Fuses the latest detection of each marker from every camera into one position.
+# Detections older than `max_age` are ignored; the rest are averaged, weighted by
+# confidence and by how fresh they are. Returns objects in `labels` order (None if unseen),
+# shaped like the decoded objects app.py works with.
+class MarkerFusion:
+    def __init__(self, labels=LABELS, max_age=MAX_AGE):
+        self.labels = labels
+        self.max_age = max_age
+        self._latest = {}  # (camera, label) -> (timestamp, obj, confidence)
+
+    def update(self, camera, timestamp, detections):
+        for label, (obj, confidence) in detections.items():
+            self._latest[(camera, label)] = (timestamp, obj, confidence)
+
+    def fuse(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        fused = []
+        for label in self.labels:
+            total, position, best, best_weight = 0.0, np.zeros(2), None, 0.0
+            for (camera, seen_label), (timestamp, obj, confidence) in self._latest.items():
+                age = now - timestamp
+                if seen_label != label or age > self.max_age:
+                    continue
+                weight = confidence * (1.0 - max(age, 0.0) / self.max_age)
+                total += weight
+                position += weight * _center(obj)
+                if weight > best_weight:
+                    best, best_weight = obj, weight
+            if best is None or total <= 0:
+                fused.append(None)
+                continue
+            # Best single view, moved so its centre sits at the fused position
+            dx, dy = position / total - _center(best)
+            fused.append(transform_decoded(best, dx, dy))
+        return tuple(fused)
+
+
+def draw_world(canvas, fused):
+    canvas[:] = 0
+    for obj, label, color in zip(fused, LABELS, [(0, 255, 0), (0, 0, 255)]):
+        if obj is not None:
+            pts = np.array(obj.polygon, dtype=np.int32).reshape((-1, 1, 2))
+            cv2.polylines(canvas, [pts], True, color, 3)
+            cv2.putText(canvas, label, (obj.rect.left, obj.rect.top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+    return canvas
+
+
+# Run one worker per camera and drive the car from the fused positions with the steering.py rule.
+# The car connection is made here, after the workers have started, so they never inherit it.
+def run_multicam(cameras, car_host=CAR_HOST):
+    results = multiprocessing.Queue(maxsize=RESULT_QUEUE_SIZE)
+    stop = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=camera_worker, daemon=True,
+                                       args=(i, camera["source"], camera["homography"], results, stop))
+               for i, camera in enumerate(cameras)]
+    for worker in workers:
+        worker.start()
+
+    car_client = CarClient(car_host)
+    command_scheduler = CommandScheduler(car_client.control)
+    fusion = MarkerFusion()
+    canvas = np.zeros(WORLD_VIEW_SIZE + (3,), dtype=np.uint8)
+    while any(worker.is_alive() for worker in workers):
+        try:
+            camera, timestamp, detections = results.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        fusion.update(camera, timestamp, detections)
+        metrics.observe("fusion_latency", time.monotonic() - timestamp)
+
+        car_qr, target_qr = fusion.fuse()
+        if car_qr and target_qr:
+            command, speed, _ = steering_command(car_qr, target_qr)
+            command_scheduler.submit(command, speed)
+        else:
+            command_scheduler.submit("stop", 0)
+
+        cv2.imshow("Fused World View", draw_world(canvas, (car_qr, target_qr)))
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    command_scheduler.send_now("stop", 0)
+    stop.set()
+    for worker in workers:
+        worker.join(1.0)
+    command_scheduler.close()
+    car_client.close()
+    cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Track the car with several overhead cameras")
+    parser.add_argument("--config", help="JSON list of cameras: [{\"source\": 0, \"homography\": [[...]]}, ...]")
+    parser.add_argument("--car", default=CAR_HOST, help="Host of the car to drive")
+    args = parser.parse_args()
+    run_multicam(load_cameras(args.config) if args.config else CAMERAS, args.car)
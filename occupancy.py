@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+# Default extraction settings
+CELL_SIZE = 10  # Camera pixels per maze cell, as in mazeapp.py
+CANNY_THRESHOLDS = (50, 150)  # Same edge detector settings as mazeapp.process_frame
+WALL_ON = 0.12  # Fraction of edge pixels that turns a free cell into a wall
+WALL_OFF = 0.04  # Fraction of edge pixels below which a wall cell becomes free again
+MARKER_PADDING = 1  # Extra cells kept free around each QR marker
+
+
+# Grayscale + Canny edges of a BGR camera frame
+def edge_image(frame, thresholds=CANNY_THRESHOLDS):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.Canny(gray, *thresholds)
+
+
+# Fraction of non-zero pixels in each cell_size x cell_size block (partial blocks at the edges are cut off)
+def block_density(image, cell_size=CELL_SIZE):
+    rows, cols = image.shape[0] // cell_size, image.shape[1] // cell_size
+    blocks = image[:rows * cell_size, :cols * cell_size].reshape(rows, cell_size, cols, cell_size)
+    return np.count_nonzero(blocks, axis=(1, 3)) / (cell_size * cell_size)
+
+
+# Occupancy grid built from the edge image of each frame.
+# Every cell is the edge density of its block of pixels; a cell becomes a wall above
+# `wall_on` and only becomes free again below `wall_off`, so cells near the threshold
+# do not flicker between frames. Cells under the QR markers are always free (the
+# codes themselves are full of edges). update() returns the changed cells so the
+# planner and mini-map can repair only those.
+class OccupancyGrid:
+    def __init__(self, cell_size=CELL_SIZE, wall_on=WALL_ON, wall_off=WALL_OFF, padding=MARKER_PADDING):
+        self.cell_size = cell_size
+        self.wall_on = wall_on
+        self.wall_off = wall_off
+        self.padding = padding
+        self.maze = None  # uint8 grid, 1 = wall
+
+    # Rect (left, top, width, height) in pixels -> slice of grid cells, padded
+    def _cells(self, rect):
+        left, top, width, height = rect
+        cell, pad = self.cell_size, self.padding
+        rows = slice(max(int(top // cell) - pad, 0), int((top + height) // cell) + pad + 1)
+        cols = slice(max(int(left // cell) - pad, 0), int((left + width) // cell) + pad + 1)
+        return rows, cols
+
+    # Update the grid from an edge (or threshold) image; `markers` are rects to keep free.
+    # Returns (maze, changed) where changed is an (N, 2) array of (row, col) cells.
+    def update(self, edges, markers=()):
+        density = block_density(edges, self.cell_size)
+        if self.maze is None or self.maze.shape != density.shape:
+            previous = np.zeros(density.shape, dtype=np.uint8)
+        else:
+            previous = self.maze
+
+        walls = np.where(previous == 1, density > self.wall_off, density > self.wall_on)
+        for rect in markers:
+            walls[self._cells(rect)] = False
+
+        maze = walls.astype(np.uint8)
+        changed = np.argwhere(maze != previous)
+        self.maze = maze
+        return maze, changed
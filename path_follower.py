@@ -0,0 +1,190 @@
+import math
+import time
+
+import numpy as np
+
+from metrics import metrics
+
+# Default follower settings
+PLAN_SPEED = 150  # Wheel PWM the car drives a plan at
+MAX_PLAN_STEPS = 8  # Steps per batch; the rest of the route is sent when the car gets there
+DRIFT_TOLERANCE = 1.5  # Cells the car may be off the planned route before the plan is re-issued
+ARRIVE_TOLERANCE = 1.0  # Cells from the end of a batch that count as having driven it
+REISSUE_INTERVAL = 0.5  # Minimum seconds between plans, so the car gets to act on the last one
+MIN_TURN = 5.0  # Turns smaller than this (degrees) are left out of the plan
+
+
+# Corner cells of a grid path: start, every cell where the direction changes, and the end.
+# This is the run-length encoding of the path: consecutive moves in one direction collapse
+# into a single straight run.
+def compress_path(path):
+    cells = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+    if len(cells) < 3:
+        return cells
+    moves = np.diff(cells, axis=0)
+    turns = np.flatnonzero(np.any(moves[1:] != moves[:-1], axis=1)) + 1
+    return cells[np.concatenate(([0], turns, [len(cells) - 1]))]
+
+
+# True if the straight line between two cells crosses no wall
+def line_of_sight(maze, a, b):
+    count = int(max(abs(b[0] - a[0]), abs(b[1] - a[1]))) * 4 + 1
+    rows = np.rint(np.linspace(a[0], b[0], count)).astype(int)
+    cols = np.rint(np.linspace(a[1], b[1], count)).astype(int)
+    return not maze[rows, cols].any()
+
+
+# Drop corners the car can drive past in a straight line (turns 4-connected staircases
+# into single diagonal runs)
+def smooth_corners(maze, corners):
+    if len(corners) < 3:
+        return corners
+    kept = [0]
+    i = 0
+    while i < len(corners) - 1:
+        j = len(corners) - 1
+        while j > i + 1 and not line_of_sight(maze, corners[i], corners[j]):
+            j -= 1
+        kept.append(j)
+        i = j
+    return corners[kept]
+
+
+# Grid heading (degrees) of a move (rows grow downwards, so "up" in the image is 90)
+def grid_heading(move):
+    return math.degrees(math.atan2(-move[0], move[1]))
+
+
+# Signed turn (degrees, positive = left) from one heading to another, in (-180, 180]
+def turn_angle(heading, new_heading):
+    return -((heading - new_heading + 180.0) % 360.0 - 180.0)
+
+
+# Plan steps for driving through `corners`: ("L", degrees) / ("R", degrees) turns on the
+# spot and ("F", distance) straight runs, with distances in cells * cell_length.
+# Returns (steps, heading at the end of the plan).
+def plan_steps(corners, heading, cell_length=1.0, max_steps=MAX_PLAN_STEPS):
+    legs = np.diff(np.asarray(corners, dtype=np.float64), axis=0)
+    steps = []
+    for leg in legs:
+        new_heading = grid_heading(leg)
+        turn = turn_angle(heading, new_heading) if heading is not None else 0.0
+        leg_steps = [("L" if turn > 0 else "R", round(abs(turn), 1))] if abs(turn) >= MIN_TURN else []
+        leg_steps.append(("F", round(float(np.hypot(*leg)) * cell_length, 1)))
+        # A leg's turn and its forward run go out together, so stop before one that does not fit
+        if len(steps) + len(leg_steps) > max_steps:
+            break
+        steps.extend(leg_steps)
+        heading = new_heading
+    return steps, heading
+
+
+# Wire format of a plan for the /plan route: "L90,F30.0,R45,F12.5"
+def encode_plan(steps):
+    return ",".join(f"{kind}{value:g}" for kind, value in steps)
+
+
+def decode_plan(text):
+    return [(item[0], float(item[1:])) for item in text.split(",") if item]
+
+
+# Distance (cells) from `position` to the nearest point of a polyline through `corners`,
+# and the index of the leg it is nearest to
+def distance_to_route(corners, position):
+    corners = np.asarray(corners, dtype=np.float64)
+    point = np.asarray(position, dtype=np.float64)
+    if len(corners) < 2:
+        return float(np.hypot(*(point - corners[0]))), 0
+    start, end = corners[:-1], corners[1:]
+    legs = end - start
+    lengths = np.maximum(np.einsum("ij,ij->i", legs, legs), 1e-9)
+    t = np.clip(np.einsum("ij,ij->i", point - start, legs) / lengths, 0.0, 1.0)
+    distances = np.hypot(*(start + t[:, None] * legs - point).T)
+    leg = int(np.argmin(distances))
+    return float(distances[leg]), leg
+
+
+# Drives the car along planned paths with a few batched commands per route.
+# Each frame update() gets the planner's path (starting at the car's cell); a plan is
+# only sent when there is none yet, the car has drifted more than `drift` cells off the
+# route, the goal moved, or the car has finished the batch it was sent. Everything in
+# between only checks progress against the tracked position.
+class PathFollower:
+    def __init__(self, send_plan, cell_length=1.0, maze=None, speed=PLAN_SPEED, drift=DRIFT_TOLERANCE,
+                 arrive=ARRIVE_TOLERANCE, max_steps=MAX_PLAN_STEPS, reissue_interval=REISSUE_INTERVAL):
+        self.send_plan = send_plan  # Called with (steps, speed), e.g. CarClient.plan
+        self.cell_length = cell_length  # Car distance units per cell
+        self.maze = maze  # Grid used to straighten routes (None = follow the grid path's corners)
+        self.speed = speed
+        self.drift = drift
+        self.arrive = arrive
+        self.max_steps = max_steps
+        self.reissue_interval = reissue_interval
+        self.heading = None  # Heading the car should have at the end of the last plan (unknown at first)
+        self.route = None  # Corners of the batch the car is driving
+        self.goal = None
+        self.plans = 0
+        self.updates = 0
+        self._sent_at = 0.0
+        self._anchor = None  # Where the car was when its movement was last measured
+        self._moved_heading = None  # Direction of the car's latest movement of at least a cell
+
+    # Heading from the car's own movement: updated each time it has moved a full cell
+    def _observe(self, position):
+        if self._anchor is None:
+            self._anchor = position
+            return
+        move = (position[0] - self._anchor[0], position[1] - self._anchor[1])
+        if np.hypot(*move) >= 1.0:
+            self._moved_heading = grid_heading(move)
+            self._anchor = position
+
+    def _issue(self, path, heading, now):
+        corners = compress_path(path)
+        if self.maze is not None:
+            corners = smooth_corners(self.maze, corners)
+        steps, self.heading = plan_steps(corners, heading, self.cell_length, self.max_steps)
+        # Keep the corners that this batch actually covers
+        legs = sum(1 for kind, _ in steps if kind == "F")
+        self.route = corners[:legs + 1]
+        self.goal = tuple(path[-1])
+        self._sent_at = now
+        self.plans += 1
+        metrics.inc("plans_sent")
+        self.send_plan(steps, self.speed)
+        return steps
+
+    # Check progress and re-plan if needed; returns the steps sent, or None.
+    # `heading` is the car's measured heading (degrees, as grid_heading) if the tracker has one;
+    # otherwise it is taken from the car's movement.
+    def update(self, path, position, heading=None, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.updates += 1
+        self._observe(position)
+        observed = heading if heading is not None else self._moved_heading
+        if len(path) < 2:
+            if self.route is not None:
+                self.route = None
+                self.send_plan([], 0)  # At the goal (or no route): stop
+            return None
+        if now - self._sent_at < self.reissue_interval:
+            return None
+        if self.route is None:
+            return self._issue(path, observed if observed is not None else self.heading, now)
+
+        off_route, leg = distance_to_route(self.route, position)
+        goal_moved = np.hypot(*np.subtract(path[-1], self.goal)) > self.drift
+        at_batch_end = np.hypot(*np.subtract(position, self.route[-1])) <= self.arrive
+        batch_done = at_batch_end and tuple(self.route[-1]) != self.goal
+        if off_route > self.drift or goal_moved:
+            # The car is not where the plan expects: start from where it is, facing the way it is going
+            if observed is None and len(self.route) > 1:
+                observed = grid_heading(self.route[leg + 1] - self.route[leg])
+            return self._issue(path, observed, now)
+        if batch_done:
+            return self._issue(path, self.heading, now)
+        return None
+
+    def stats(self):
+        return {"plans": self.plans, "updates": self.updates}
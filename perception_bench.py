@@ -0,0 +1,297 @@
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from detectors import DETECTOR, DETECTORS, make_detector
+from frame_context import FrameContextPool
+from motion import MarkerPredictor
+from qr import TAG_FAMILIES, make_aruco_image, make_qr_image
+from qr_tracker import QRTracker
+
+# Default scene settings
+FRAME_SIZE = (720, 1280)  # (height, width) of synthetic frames
+MARKER_SIZE = 160  # Marker side in pixels at scale 1.0
+SCALES = (0.6, 1.4)  # Random marker scale range
+ANGLES = (-30, 30)  # Random rotation range in degrees
+BLUR = (0.0, 1.5)  # Random Gaussian blur sigma range
+NOISE = (0.0, 12.0)  # Random Gaussian noise sigma range (grey levels)
+SEQUENCE_LENGTH = 50  # Frames per synthetic sequence before a new scene starts (0 = every frame is a new scene)
+MOTION = 6.0  # Maximum marker movement per frame in a sequence, in pixels
+TURN = 1.0  # Maximum marker rotation per frame in a sequence, in degrees
+
+
+# Grayscale marker image for a payload such as "car" or "target", in the tag family of a backend
+def marker_image(data, backend="pyzbar"):
+    if TAG_FAMILIES[backend] == "aruco":
+        return np.array(make_aruco_image(data, size=120, border=20))
+    return np.array(make_qr_image(data, box_size=4, border=4).convert("L"))
+
+
+# Smooth random background so the scene is not a flat colour
+def make_background(rng, size=FRAME_SIZE):
+    height, width = size
+    coarse = rng.uniform(60, 200, size=(height // 40 + 1, width // 40 + 1)).astype(np.float32)
+    return cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+# Paste a marker into the frame at `center` with the given scale and rotation; returns its true centre
+def place_marker(frame, marker, center, scale, angle):
+    size = MARKER_SIZE * scale / marker.shape[0]
+    matrix = cv2.getRotationMatrix2D((marker.shape[1] / 2, marker.shape[0] / 2), angle, size)
+    matrix[0, 2] += center[0] - marker.shape[1] / 2
+    matrix[1, 2] += center[1] - marker.shape[0] / 2
+    height, width = frame.shape
+    warped = cv2.warpAffine(marker.astype(np.float32), matrix, (width, height), flags=cv2.INTER_LINEAR)
+    mask = cv2.warpAffine(np.ones_like(marker, dtype=np.float32), matrix, (width, height))
+    frame *= 1 - mask
+    frame += warped * mask
+    return center
+
+
+# Area a marker may be placed in: car on the left half, target on the right half so they never overlap
+def marker_bounds(index, size=FRAME_SIZE, scales=SCALES):
+    height, width = size
+    margin = int(MARKER_SIZE * max(scales))
+    return (margin + index * width / 2, margin), ((index + 1) * width / 2 - margin, height - margin)
+
+
+# Draw markers at their poses {label: (x, y, scale, angle)} on a background, then blur and add noise;
+# returns (BGR frame, true centres)
+def render_scene(rng, markers, poses, background, sigma, noise_sigma):
+    frame = background.copy()
+    truth = {}
+    for label, marker in markers.items():
+        x, y, scale, angle = poses[label]
+        truth[label] = place_marker(frame, marker, (x, y), scale, angle)
+
+    if sigma > 0.1:
+        frame = cv2.GaussianBlur(frame, (0, 0), sigma)
+    frame += rng.normal(0, noise_sigma, size=frame.shape).astype(np.float32)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), truth
+
+
+# Build one synthetic BGR frame with a car and a target marker; returns (frame, true centres)
+def make_scene(rng, markers, size=FRAME_SIZE, scales=SCALES, angles=ANGLES, blur=BLUR, noise=NOISE):
+    background = make_background(rng, size)
+    poses = {}
+    for i, label in enumerate(markers):
+        low, high = marker_bounds(i, size, scales)
+        poses[label] = (rng.uniform(low[0], high[0]), rng.uniform(low[1], high[1]),
+                        rng.uniform(*scales), rng.uniform(*angles))
+    return render_scene(rng, markers, poses, background, rng.uniform(*blur), rng.uniform(*noise))
+
+
+# Consecutive frames of one scene, as a fixed camera sees them: the markers start at random
+# poses and then move and turn a little every frame (bouncing off the edges of their area),
+# so the ROI tracker and motion predictor have something to follow. Blur is fixed for the
+# sequence; sensor noise is new in every frame.
+def make_sequence(rng, markers, length, size=FRAME_SIZE, scales=SCALES, angles=ANGLES, blur=BLUR, noise=NOISE,
+                  motion=MOTION, turn=TURN):
+    background = make_background(rng, size)
+    bounds, poses, velocities = {}, {}, {}
+    for i, label in enumerate(markers):
+        low, high = bounds[label] = np.array(marker_bounds(i, size, scales))
+        poses[label] = np.array([rng.uniform(low[0], high[0]), rng.uniform(low[1], high[1]),
+                                 rng.uniform(*scales), rng.uniform(*angles)])
+        velocities[label] = np.array([*rng.uniform(-motion, motion, 2), 0.0, rng.uniform(-turn, turn)])
+    sigma, noise_sigma = rng.uniform(*blur), rng.uniform(*noise)
+
+    frames = []
+    for _ in range(length):
+        frames.append(render_scene(rng, markers, poses, background, sigma, noise_sigma))
+        for label, pose in poses.items():
+            low, high = bounds[label]
+            velocity = velocities[label]
+            pose += velocity
+            for axis in range(2):
+                if not low[axis] <= pose[axis] <= high[axis]:
+                    velocity[axis] = -velocity[axis]
+                    pose[axis] = np.clip(pose[axis], low[axis], high[axis])
+            if not angles[0] <= pose[3] <= angles[1]:
+                velocity[3] = -velocity[3]
+                pose[3] = np.clip(pose[3], *angles)
+    return frames
+
+
+# `count` synthetic frames: sequences of `sequence_length` correlated frames, or independent
+# scenes when sequence_length is 0
+def synthetic_frames(count, seed=0, backend="pyzbar", sequence_length=SEQUENCE_LENGTH, **scene_options):
+    rng = np.random.default_rng(seed)
+    markers = {"car": marker_image("car", backend), "target": marker_image("target", backend)}
+    if not sequence_length:
+        return [make_scene(rng, markers, **scene_options) for _ in range(count)]
+    frames = []
+    while len(frames) < count:
+        frames += make_sequence(rng, markers, min(sequence_length, count - len(frames)), **scene_options)
+    return frames
+
+
+# Frames from a recorded video (no ground truth, so recall is not reported)
+def video_frames(path, count):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append((frame, None))
+    cap.release()
+    return frames
+
+
+# Centres of the detected (car_qr, target_qr) pair
+def detected_centres(car_qr, target_qr):
+    centres = {}
+    for label, obj in (("car", car_qr), ("target", target_qr)):
+        if obj is not None:
+            centres[label] = (obj.rect.left + obj.rect.width / 2, obj.rect.top + obj.rect.height / 2)
+    return centres
+
+
+# Bare detector backend: centres of the markers whose id is a label
+def detector_stage(name):
+    detector = make_detector(name)
+
+    def run_detector(frame):
+        return {marker.id: marker.center for marker in detector(frame) if marker.id in ("car", "target")}
+
+    return run_detector
+
+
+# Run a stage that works on a FrameContext from `pool`, as the apps do, on a plain frame
+def with_context(func, pool):
+    def run(frame):
+        context = pool.acquire(frame)
+        try:
+            return func(context)
+        finally:
+            context.release()
+
+    return run
+
+
+# Marker tracker set up as app.py sets up its own (ROI_TRACKING), without importing app,
+# whose module-level car connection, command scheduler and calibration a benchmark must not start
+def marker_tracker():
+    detector = make_detector(DETECTOR)
+    return QRTracker(labels=("car", "target"), decoder=detector, roi_decoder=detector)
+
+
+# Stages to benchmark: name -> function(frame) returning detected centres (or None)
+def load_stages(names):
+    stages = {}
+    for name in names:
+        if name == "track_qr_codes":
+            # app.track_qr_codes: ROI tracking
+            stages[name] = with_context(lambda context, f=marker_tracker().track: detected_centres(*f(context)),
+                                        FrameContextPool())
+        elif name == "decode_frame":
+            # app.decode_frame: ROI tracking plus motion prediction between decodes
+            predictor = MarkerPredictor(marker_tracker().track)
+            stages[name] = with_context(lambda context, f=predictor.track: detected_centres(*f(context)),
+                                        FrameContextPool())
+        elif name == "detect_qr_codes":
+            import mazeapp
+            stages[name] = with_context(lambda context, f=mazeapp.detect_qr_codes: detected_centres(*f(context)),
+                                        mazeapp.frame_contexts)
+        elif name == "process_frame":
+            import mazeapp
+            maze = np.zeros((20, 20), dtype=np.uint8)
+
+            # With the shared edge view and the reused output buffers, as in mazeapp.main
+            def run_process_frame(context, f=mazeapp.process_frame):
+                frame = context.frame
+                walls = context.buffer("walls", (maze.shape[0] * mazeapp.CELL_SIZE, maze.shape[1] * mazeapp.CELL_SIZE))
+                f(frame, maze, (10, 10), (5, 5), edges=context.edges(), out=context.buffer("bw_view", frame.shape),
+                  walls_out=walls)
+                return None  # Nothing to score for recall
+
+            stages[name] = with_context(run_process_frame, mazeapp.frame_contexts)
+        else:
+            raise ValueError(f"Unknown stage: {name}")
+    return stages
+
+
+# Time each stage over the frames. The first `warmup` frames are run but not measured; the
+# rest follow on from them, so trackers are measured on a sequence they have really seen so far.
+def run_benchmark(frames, stages, warmup=5):
+    results = {}
+    for name, func in stages.items():
+        for frame, _ in frames[:warmup]:
+            func(frame)
+
+        latencies = []
+        found = expected = 0
+        for frame, truth in frames[warmup:]:
+            start = time.perf_counter()
+            centres = func(frame)
+            latencies.append(time.perf_counter() - start)
+
+            if truth is not None and centres is not None:
+                for label, (tx, ty) in truth.items():
+                    expected += 1
+                    if label in centres:
+                        cx, cy = centres[label]
+                        if abs(cx - tx) < MARKER_SIZE / 2 and abs(cy - ty) < MARKER_SIZE / 2:
+                            found += 1
+
+        latencies = np.array(latencies) * 1000
+        results[name] = {
+            "fps": len(latencies) / (latencies.sum() / 1000),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "recall": found / expected if expected else None,
+        }
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"{'stage':<18}{'fps':>10}{'p50 ms':>10}{'p99 ms':>10}{'recall':>9}")
+    for name, r in results.items():
+        recall = f"{r['recall']:.3f}" if r["recall"] is not None else "-"
+        print(f"{name:<18}{r['fps']:>10.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{recall:>9}")
+        if baseline and name in baseline:
+            b = baseline[name]
+            print(f"{'  vs baseline':<18}{r['fps'] / b['fps']:>9.2f}x"
+                  f"{r['p50_ms'] - b['p50_ms']:>+10.2f}{r['p99_ms'] - b['p99_ms']:>+10.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless perception benchmark on synthetic QR scenes or a video")
+    parser.add_argument("--frames", type=int, default=200, help="Number of frames to run")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for synthetic scenes")
+    parser.add_argument("--sequence-length", type=int, default=SEQUENCE_LENGTH,
+                        help="Frames per synthetic sequence with moving markers (0 = independent scenes)")
+    parser.add_argument("--video", help="Use frames from a recorded video instead of synthetic scenes")
+    parser.add_argument("--stages", default="track_qr_codes,decode_frame,detect_qr_codes,process_frame",
+                        help="Comma-separated stages to run")
+    parser.add_argument("--detectors", help="Comma-separated detector backends to compare "
+                        f"({', '.join(DETECTORS)}), each on scenes with its own tags")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved by an earlier run")
+    args = parser.parse_args()
+
+    if args.video:
+        frames = video_frames(args.video, args.frames)
+    else:
+        frames = synthetic_frames(args.frames, args.seed, sequence_length=args.sequence_length)
+    results = run_benchmark(frames, load_stages(args.stages.split(","))) if args.stages else {}
+    for name in args.detectors.split(",") if args.detectors else []:
+        # Same seed, so every backend sees the same positions, scales, blur and noise
+        scenes = frames if args.video else synthetic_frames(args.frames, args.seed, backend=name,
+                                                            sequence_length=args.sequence_length)
+        results.update(run_benchmark(scenes, {f"detector:{name}": detector_stage(name)}))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
@@ -1,20 +1,67 @@
+import math
+import cv2
 import qrcode
-from PIL import Image
+from PIL import Image, ImageDraw
+from detectors import ARUCO_DICTIONARY, aruco_id
 
-# Function to generate QR code with a specific data string
-def generate_qr_code(data, filename):
+# Tag family printed for each detector backend (pyzbar and OpenCV both read QR codes)
+TAG_FAMILIES = {"pyzbar": "qr", "opencv": "qr", "aruco": "aruco"}
+
+# Function to build a QR code image (PIL) for a specific data string
+def make_qr_image(data, box_size=10, border=4):
     # Create a QR code from the data string
     qr = qrcode.QRCode(
         version=1,  # Version of the QR code (1 is the smallest)
         error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,  # Size of each box in the QR code grid
-        border=4,  # Thickness of the border around the QR code
+        box_size=box_size,  # Size of each box in the QR code grid
+        border=border,  # Thickness of the border around the QR code
     )
     qr.add_data(data)  # Add the data string to the QR code
     qr.make(fit=True)  # Fit the QR code to the size
 
     # Create an image from the QR code
-    img = qr.make_image(fill='black', back_color='white')
+    return qr.make_image(fill='black', back_color='white')
+
+# Function to build an ArUco marker image (PIL) for a payload such as "car" or "car:3"
+def make_aruco_image(data, size=200, border=40):
+    dictionary = cv2.aruco.getPredefinedDictionary(ARUCO_DICTIONARY)
+    marker = cv2.aruco.generateImageMarker(dictionary, aruco_id(data), size)
+    # White quiet zone around the marker, like the QR code border
+    marker = cv2.copyMakeBorder(marker, border, border, border, border, cv2.BORDER_CONSTANT, value=255)
+    return Image.fromarray(marker)
+
+# Function to build the tag image a detector backend reads
+def make_tag_image(data, backend="pyzbar"):
+    if TAG_FAMILIES[backend] == "aruco":
+        return make_aruco_image(data)
+    return make_qr_image(data)
+
+# Function to lay out the tags for several payloads on one printable sheet
+def generate_tag_sheet(payloads, filename, backend="pyzbar", columns=3):
+    images = [make_tag_image(data, backend).convert("L") for data in payloads]
+    cell = max(max(img.size) for img in images)
+    label_height = 30
+    rows = math.ceil(len(images) / columns)
+    sheet = Image.new("L", (columns * cell, rows * (cell + label_height)), 255)
+    draw = ImageDraw.Draw(sheet)
+    for i, (data, img) in enumerate(zip(payloads, images)):
+        x, y = (i % columns) * cell, (i // columns) * (cell + label_height)
+        sheet.paste(img, (x + (cell - img.size[0]) // 2, y))
+        draw.text((x + cell // 2 - 4 * len(data), y + cell + 8), data, fill=0)
+    sheet.save(filename)
+
+# Generate one tag sheet per tag family, e.g. for the car, the target and fleet IDs
+def generate_tag_sheets(payloads=("car", "target")):
+    for family in sorted(set(TAG_FAMILIES.values())):
+        backend = next(name for name, tags in TAG_FAMILIES.items() if tags == family)
+        backends = ", ".join(name for name, tags in TAG_FAMILIES.items() if tags == family)
+        filename = f"tags_{family}.png"
+        generate_tag_sheet(payloads, filename, backend)
+        print(f"Tag sheet for {backends} saved as {filename}")
+
+# Function to generate QR code with a specific data string
+def generate_qr_code(data, filename):
+    img = make_qr_image(data)
 
     # Save the image
     img.save(filename)
@@ -36,3 +83,4 @@ def generate_car_and_target_qr_codes():
 # Main function to generate the QR codes
 if __name__ == '__main__':
     generate_car_and_target_qr_codes()
+    generate_tag_sheets(("car", "target", "car:1", "target:1", "car:2", "target:2"))
@@ -0,0 +1,115 @@
+import cv2
+from pyzbar.pyzbar import decode, ZBarSymbol
+from pyzbar.locations import Point, Rect
+
+from frame_context import FrameContext
+
+# Default tracking settings
+FULL_SCAN_INTERVAL = 15  # Frames between full-frame scans
+ROI_PADDING = 0.5  # Padding around the last polygon, as a fraction of its size
+SCALE = 1.0  # Downscale factor applied before decoding (1.0 = full resolution)
+
+
+# Decode QR codes only (skips the 1D barcode scanners pyzbar runs by default)
+def decode_qr(image):
+    return decode(image, symbols=[ZBarSymbol.QRCODE])
+
+
+# Frame coordinate of a crop/downscaled coordinate; integer corners (pyzbar) stay
+# integers, sub-pixel corners (e.g. ArUco) keep their precision
+def _to_frame(value, offset, scale):
+    if isinstance(value, float):
+        return (value + offset) / scale
+    return int(round((value + offset) / scale))
+
+
+# Move a decoded object from crop/downscaled coordinates back into frame coordinates
+def transform_decoded(obj, offset_x=0, offset_y=0, scale=1.0):
+    polygon = [Point(_to_frame(p.x, offset_x, scale), _to_frame(p.y, offset_y, scale)) for p in obj.polygon]
+    rect = Rect(int(round((obj.rect.left + offset_x) / scale)), int(round((obj.rect.top + offset_y) / scale)),
+                int(round(obj.rect.width / scale)), int(round(obj.rect.height / scale)))
+    return obj._replace(rect=rect, polygon=polygon)
+
+
+# Incremental QR tracker.
+# Remembers where each labelled code was last seen and decodes only padded crops
+# around those spots, on a grayscale (optionally downscaled) image. A full-frame
+# scan runs every `full_scan_interval` frames, or as soon as a code is lost.
+class QRTracker:
+    def __init__(self, labels=("car", "target"), full_scan_interval=FULL_SCAN_INTERVAL,
+                 padding=ROI_PADDING, scale=SCALE, decoder=decode_qr, roi_decoder=decode_qr):
+        self.labels = labels
+        self.full_scan_interval = full_scan_interval
+        self.padding = padding
+        self.scale = scale
+        self.decoder = decoder  # Full-frame decoder, e.g. a DecodePool
+        self.roi_decoder = roi_decoder  # Decoder for the small crops around known codes
+        self._last = {}  # label -> last decoded object (frame coordinates)
+        self._frame_count = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    # Match decoded data against the labels ("car", "target", ...)
+    def _label(self, obj):
+        data = obj.data.decode("utf-8").lower()
+        for label in self.labels:
+            if label in data:
+                return label
+        return None
+
+    def _collect(self, objects, found, offset_x=0, offset_y=0):
+        for obj in objects:
+            label = self._label(obj)
+            if label is not None:
+                found[label] = transform_decoded(obj, offset_x, offset_y, self.scale)
+
+    # Grayscale (optionally downscaled) image to decode; `frame` may be a BGR frame or a
+    # FrameContext, whose shared views are computed once per frame for every stage
+    def _prepare(self, frame):
+        if isinstance(frame, FrameContext):
+            return frame.scaled(self.scale)
+        image = frame
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return image
+
+    # Padded crop window (in scaled image coordinates) around a code's last polygon
+    def _window(self, obj, shape):
+        xs = [p.x * self.scale for p in obj.polygon]
+        ys = [p.y * self.scale for p in obj.polygon]
+        pad = self.padding * max(max(xs) - min(xs), max(ys) - min(ys))
+        x0, y0 = max(int(min(xs) - pad), 0), max(int(min(ys) - pad), 0)
+        x1, y1 = min(int(max(xs) + pad) + 1, shape[1]), min(int(max(ys) + pad) + 1, shape[0])
+        return x0, y0, x1, y1
+
+    def full_scan(self, image):
+        found = {}
+        self._collect(self.decoder(image), found)
+        self.full_scans += 1
+        return found
+
+    # Track the labelled codes in a frame (or FrameContext); returns them in label order, e.g. (car_qr, target_qr)
+    def track(self, frame):
+        image = self._prepare(frame)
+        due = self._frame_count % self.full_scan_interval == 0
+        self._frame_count += 1
+
+        if due or any(label not in self._last for label in self.labels):
+            found = self.full_scan(image)
+        else:
+            found = {}
+            for label in self.labels:
+                if label in found:
+                    continue  # Already picked up in another code's window
+                x0, y0, x1, y1 = self._window(self._last[label], image.shape)
+                if x1 <= x0 or y1 <= y0:
+                    continue
+                self._collect(self.roi_decoder(image[y0:y1, x0:x1]), found, x0, y0)
+                self.roi_scans += 1
+            if any(label not in found for label in self.labels):
+                found = self.full_scan(image)  # A code was lost, look everywhere
+
+        self._last = found
+        return tuple(found.get(label) for label in self.labels)
@@ -0,0 +1,43 @@
+import numpy as np
+
+from calibration import marker_centers
+
+# Constants
+MAX_SPEED = 255  # Maximum speed of the car
+MIN_DISTANCE = 50  # Minimum distance (in pixels, or cm when calibrated) to stop
+MAX_DISTANCE = 300  # Maximum distance (in pixels, or cm when calibrated) for full speed
+
+
+# Function to calculate speed based on distance
+def calculate_speed(distance):
+    # Map distance to speed using a linear scale
+    if distance <= MIN_DISTANCE:
+        return 0  # Stop
+    elif distance >= MAX_DISTANCE:
+        return MAX_SPEED  # Full speed
+    else:
+        # Linearly scale speed between MIN_DISTANCE and MAX_DISTANCE
+        return ((distance - MIN_DISTANCE) / (MAX_DISTANCE - MIN_DISTANCE)) * MAX_SPEED
+
+
+# Steering rule: turn towards the target, drive forward when roughly in line, stop when close.
+# Returns (command, speed, distance) for a car and a target QR code.
+# Positions are the marker centres; with a calibration they are mapped onto the floor first.
+def steering_command(car_qr, target_qr, calibration=None):
+    centers = marker_centers((car_qr, target_qr))
+    if calibration:
+        centers = calibration.to_world(centers)
+    car_center, target_center = centers
+    distance = np.sqrt((car_center[0] - target_center[0]) ** 2 + (car_center[1] - target_center[1]) ** 2)
+
+    # Calculate speed based on distance
+    speed = calculate_speed(distance)
+
+    # Determine movement
+    if speed <= 0:
+        return "stop", 0, distance  # Stop
+    if target_center[0] < car_center[0] - 50:
+        return "left", speed, distance  # Turn left
+    if target_center[0] > car_center[0] + 50:
+        return "right", speed, distance  # Turn right
+    return "forward", speed, distance  # Move forward
@@ -0,0 +1,180 @@
+import argparse
+import random
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Default UDP settings
+UDP_PORT = 4210  # Port the car (or the simulator) listens on for control datagrams
+
+# One datagram per command: command byte, left and right wheel speeds (-255..255),
+# sender session and sequence number
+PACKET = struct.Struct("<BhhII")
+
+# Command byte values. Named commands carry their speed in both wheel fields;
+# WHEELS drives the left and right wheels directly (differential drive).
+COMMANDS = {"stop": 0, "forward": 1, "backward": 2, "left": 3, "right": 4, "wheels": 5}
+COMMAND_NAMES = {code: name for name, code in COMMANDS.items()}
+COMMAND_ALIASES = {"reverse": "backward"}
+
+SEQ_MODULO = 2 ** 32
+SESSION_MODULO = 2 ** 32
+
+
+def _clamp(speed):
+    return max(-255, min(255, int(speed)))
+
+
+def encode_packet(command, left, right, seq, session=0):
+    command = COMMAND_ALIASES.get(command, command)
+    return PACKET.pack(COMMANDS[command], _clamp(left), _clamp(right), session % SESSION_MODULO, seq % SEQ_MODULO)
+
+
+# Returns (command, left, right, session, seq), or None for a malformed datagram
+def decode_packet(data):
+    if len(data) != PACKET.size:
+        return None
+    code, left, right, session, seq = PACKET.unpack(data)
+    if code not in COMMAND_NAMES:
+        return None
+    return COMMAND_NAMES[code], left, right, session, seq
+
+
+# Whether `seq` comes after `last`, allowing for wrap-around of the 32-bit counter
+def is_newer(seq, last):
+    return 0 < (seq - last) % SEQ_MODULO < SEQ_MODULO // 2
+
+
+# Sends commands to the car as single UDP datagrams.
+# Same control() call as CarClient, but there is no connection, no response to wait
+# for and one packet carries direction and speed together, so sending never blocks.
+# Lost packets are not retried: the next command (or CommandScheduler keepalive) supersedes them.
+# Every client picks a random session id, so a restarted controller, whose sequence
+# numbers start over, is not mistaken for stale packets of the previous one.
+class UdpCarClient:
+    def __init__(self, host, port=UDP_PORT):
+        self.host = host
+        self.port = port
+        self._address = (socket.gethostbyname(host), port)  # Resolve once (mDNS lookups are slow)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._lock = threading.Lock()
+        self.session = random.getrandbits(32)
+        self.seq = 0
+        self.errors = 0
+
+    def send(self, command, left, right):
+        with self._lock:
+            self.seq = (self.seq + 1) % SEQ_MODULO
+            packet = encode_packet(command, left, right, self.seq, self.session)
+            try:
+                self._socket.sendto(packet, self._address)
+            except OSError as e:
+                self.errors += 1
+                print(f"Error sending {command} to {self.host}: {e}")
+            return self.seq
+
+    def control(self, cmd, speed):
+        return self.send(cmd, speed, speed)
+
+    def wheels(self, left, right):
+        return self.send("wheels", left, right)
+
+    def close(self):
+        self._socket.close()
+
+
+# Local receiver for control datagrams (a stand-in for the car's side of the protocol).
+# Calls handler(command, left, right, seq) for each packet, in a background thread.
+# Packets that arrive after a newer one of the same session (reordered or duplicated)
+# are discarded; a new session (a restarted sender) starts the sequence check over and
+# retires the previous one, so its delayed packets are discarded too.
+class UdpReceiver:
+    def __init__(self, handler, port=UDP_PORT, host="127.0.0.1"):
+        self.handler = handler
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self._socket.settimeout(0.5)
+        self.port = self._socket.getsockname()[1]
+        self.session = None
+        self.retired = set()  # Sessions replaced by a newer one
+        self.last_seq = None
+        self.sessions = 0  # Sender sessions seen (restarts of the controller)
+        self.received = 0
+        self.stale = 0  # Out-of-order or duplicate packets discarded
+        self.malformed = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            try:
+                data, _ = self._socket.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.receive(data)
+
+    def receive(self, data):
+        packet = decode_packet(data)
+        if packet is None:
+            self.malformed += 1
+            return
+        command, left, right, session, seq = packet
+        if session in self.retired:
+            self.stale += 1
+            return
+        if session != self.session:
+            if self.session is not None:
+                self.retired.add(self.session)
+            self.session, self.last_seq = session, None
+            self.sessions += 1
+        if self.last_seq is not None and not is_newer(seq, self.last_seq):
+            self.stale += 1
+            return
+        self.last_seq = seq
+        self.received += 1
+        self.handler(command, left, right, seq)
+
+    def stop(self):
+        self._running = False
+        self._thread.join(1.0)
+        self._socket.close()
+
+
+# One-way delivery latency (send call to handler) over localhost
+def measure_udp_latency(count=200):
+    arrived = {}
+    receiver = UdpReceiver(lambda command, left, right, seq: arrived.setdefault(seq, time.perf_counter()), port=0)
+    client = UdpCarClient("127.0.0.1", receiver.port)
+    sent = {}
+    for i in range(count):
+        sent[client.control("forward", i % 255)] = time.perf_counter()
+        time.sleep(0.002)
+    time.sleep(0.2)
+    client.close()
+    receiver.stop()
+    samples = np.array([arrived[seq] - start for seq, start in sent.items() if seq in arrived]) * 1000
+    if not len(samples):
+        return {"lost": count}
+    return {"p50_ms": float(np.percentile(samples, 50)), "p99_ms": float(np.percentile(samples, 99)),
+            "lost": count - len(samples)}
+
+
+if __name__ == '__main__':
+    from car_sim import measure_round_trip, start_simulator
+
+    parser = argparse.ArgumentParser(description="Compare the UDP control channel with the HTTP path")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--http-port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server, car = start_simulator(args.http_port)
+    print(f"HTTP /control round trip: {measure_round_trip(args.http_port, args.count)}")
+    print(f"UDP datagram delivery:    {measure_udp_latency(args.count)}")
+    server.shutdown()
+    car.stop()
@@ -1,15 +1,30 @@
+import math
 import pygame
-import requests
-import time
+from car_client import CarClient
+from command_scheduler import CommandScheduler
+from udp_control import UdpCarClient
 
 # === Constants ===
-ESP32_IP = "http://esp32-car.local"  # Replace with your ESP32's IP address
-FORWARD_URL = f"{ESP32_IP}/forward"
-BACKWARD_URL = f"{ESP32_IP}/reverse"
-LEFT_URL = f"{ESP32_IP}/left"
-RIGHT_URL = f"{ESP32_IP}/right"
-STOP_URL = f"{ESP32_IP}/stop"
-SPEED_URL = f"{ESP32_IP}/setSpeed"
+ESP32_IP = "esp32-car.local"  # Replace with your ESP32's IP address
+FORWARD_URL = "/forward"
+BACKWARD_URL = "/reverse"
+LEFT_URL = "/left"
+RIGHT_URL = "/right"
+STOP_URL = "/stop"
+SPEED_URL = "/setSpeed"
+USE_UDP = False  # Send differential wheel speeds over the UDP channel (udp_control.py) instead of HTTP
+
+# === Stick handling ===
+AXIS_X = 0  # Left Joystick X (right/left)
+AXIS_Y = 1  # Left Joystick Y (forward/backward)
+DEADZONE = 0.15  # Stick deflection ignored around the centre
+TURN_GAIN = 0.7  # How strongly the X axis steers compared to the Y axis throttle
+SPEED_STEP = 10  # Wheel speed change that counts as a new command
+COMMAND_RATE = 20.0  # Maximum commands per second sent to the car
+TURN_RATIO = 0.5  # Wheel speed difference (fraction of the faster wheel) that counts as a turn over HTTP
+
+# === Shared, non-blocking connection to the car ===
+car_client = UdpCarClient(ESP32_IP) if USE_UDP else CarClient(ESP32_IP)
 
 # === Initialize Pygame ===
 pygame.init()
@@ -19,87 +34,113 @@ pygame.joystick.init()
 joystick = pygame.joystick.Joystick(0)
 joystick.init()
 
-# === Define button mappings ===
+# === Define button mappings (maximum speed) ===
 BUTTON_X = 0  # Button X
 BUTTON_Y = 1  # Button Y
 BUTTON_B = 2  # Button B
 BUTTON_A = 3  # Button A
+BUTTON_SPEEDS = {BUTTON_X: 255, BUTTON_Y: 80, BUTTON_B: 50, BUTTON_A: 0}
 
 # === Movement Control ===
 def send_command(url):
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            print(f"Command {url} sent successfully!")
-        else:
-            print(f"Failed to send command {url}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error: {e}")
+    car_client.send(url)
 
 # === Speed Control ===
 def send_speed(value):
-    try:
-        response = requests.get(f"{SPEED_URL}?value={value}")
-        if response.status_code == 200:
-            print(f"Speed set to {value}")
+    car_client.send(SPEED_URL, {"value": value})
+
+# === Stick to wheel speeds ===
+# Axis value with the deadzone removed, rescaled so it still reaches -1..1
+def apply_deadzone(value, deadzone=DEADZONE):
+    if abs(value) < deadzone:
+        return 0.0
+    return math.copysign((abs(value) - deadzone) / (1 - deadzone), value)
+
+# Differential-drive mixing: Y is proportional throttle, X steers by speeding one wheel up
+# and slowing the other down. Returns (left, right) wheel speeds in -max_speed..max_speed.
+def mix(x, y, max_speed):
+    throttle = -y  # Stick up is negative
+    turn = x * TURN_GAIN
+    left, right = throttle + turn, throttle - turn
+    scale = max(1.0, abs(left), abs(right))
+    return int(left / scale * max_speed), int(right / scale * max_speed)
+
+# Closest route of jj.ino for a pair of wheel speeds, and the speed to set with it.
+# jj.ino has no reverse turns (/left and /right drive one wheel forward), so reversing
+# with some steering still goes straight back; the turn routes are only used when
+# going forward or spinning in place (wheels turning in opposite directions).
+def drive_route(left, right):
+    fastest = max(abs(left), abs(right))
+    if fastest == 0:
+        return STOP_URL, 0
+    if left + right < 0 and left * right >= 0:
+        return BACKWARD_URL, fastest
+    if abs(left - right) < TURN_RATIO * fastest:
+        return (FORWARD_URL if left + right > 0 else BACKWARD_URL), fastest
+    return (RIGHT_URL if left > right else LEFT_URL), fastest
+
+# === Send one combined command (called by the scheduler, only on change and rate-limited) ===
+last_route, last_speed = None, None
+
+def send_drive(command, wheels):
+    global last_route, last_speed
+    left, right = wheels
+    if USE_UDP:
+        if command == "stop":
+            car_client.control("stop", 0)
         else:
-            print(f"Failed to set speed")
-    except requests.exceptions.RequestException as e:
-        print(f"Error: {e}")
+            car_client.wheels(left, right)  # Direction and speed in one datagram
+        return
+
+    # The HTTP firmware has no combined route: set the speed only when it changed, then the direction.
+    # jj.ino's /setSpeed only stores motorSpeed, so the direction route is sent again after a
+    # speed change to apply it to the motors.
+    route, speed = drive_route(left, right)
+    speed_changed = route != STOP_URL and speed != last_speed
+    if speed_changed:
+        send_speed(speed)
+        last_speed = speed
+    if route != last_route or route == STOP_URL or speed_changed:
+        send_command(route)
+        last_route = route
+
+command_scheduler = CommandScheduler(send_drive, speed_threshold=SPEED_STEP, max_rate=COMMAND_RATE)
 
 # === Main Loop ===
+# Blocks on controller events instead of polling; each stick or button change only
+# updates the latest intent, and the scheduler decides what actually goes out.
+def submit_stick(x_axis, y_axis, max_speed):
+    left, right = mix(apply_deadzone(x_axis), apply_deadzone(y_axis), max_speed)
+    if left == 0 and right == 0:
+        command_scheduler.submit("stop", (0, 0))
+    else:
+        command_scheduler.submit("drive", (left, right))
+
 try:
-    previous_command = None  # Variable to track the last movement command
-    stopped = True  # Variable to track if the car is currently stopped
+    x_axis, y_axis = 0.0, 0.0
+    max_speed = 255  # Changed with the XYBA buttons
 
     while True:
-        # === Event Handling ===
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-
-        # === Joystick Axes (Left Joystick for movement) ===
-        x_axis = joystick.get_axis(0)  # Left Joystick X (right/left)
-        y_axis = joystick.get_axis(1)  # Left Joystick Y (forward/backward)
-
-        # === Movement Control based on joystick position ===
-        if abs(x_axis) > 0.5 or abs(y_axis) > 0.5:  # Joystick is being moved
-            if y_axis < -0.5:  # Move Forward
-                if previous_command != FORWARD_URL:
-                    send_command(FORWARD_URL)
-                    previous_command = FORWARD_URL
-            elif y_axis > 0.5:  # Move Backward
-                if previous_command != BACKWARD_URL:
-                    send_command(BACKWARD_URL)
-                    previous_command = BACKWARD_URL
-            elif x_axis < -0.5:  # Turn Left
-                if previous_command != LEFT_URL:
-                    send_command(LEFT_URL)
-                    previous_command = LEFT_URL
-            elif x_axis > 0.5:  # Turn Right
-                if previous_command != RIGHT_URL:
-                    send_command(RIGHT_URL)
-                    previous_command = RIGHT_URL
-            stopped = False  # Movement detected, car is not stopped
-        else:  # Joystick is at rest
-            if not stopped:
-                send_command(STOP_URL)  # Send stop command once
-                stopped = True  # Set car to stopped state
-                previous_command = STOP_URL  # Track stop command to prevent repeat
-
-        # === Button Presses (XYBA) for Speed Control ===
-        if joystick.get_button(BUTTON_X):  # Button X to set speed to 100
-            send_speed(255)
-        elif joystick.get_button(BUTTON_Y):  # Button Y to set speed to 80
-            send_speed(80)
-        elif joystick.get_button(BUTTON_B):  # Button B to set speed to 50
-            send_speed(50)
-        elif joystick.get_button(BUTTON_A):  # Button A to set speed to 0 (Stop)
-            send_speed(0)
-
-        time.sleep(0.01)  # Shorter delay for faster response
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            break
+        elif event.type == pygame.JOYAXISMOTION:
+            if event.axis == AXIS_X:
+                x_axis = event.value
+            elif event.axis == AXIS_Y:
+                y_axis = event.value
+            else:
+                continue
+        elif event.type == pygame.JOYBUTTONDOWN and event.button in BUTTON_SPEEDS:
+            max_speed = BUTTON_SPEEDS[event.button]  # Button press, not held: one update per press
+        else:
+            continue
+        submit_stick(x_axis, y_axis, max_speed)
 
 except KeyboardInterrupt:
-    pygame.quit()
     print("Exiting...")
+
+command_scheduler.send_now("stop", (0, 0))
+command_scheduler.close()
+car_client.close()
+pygame.quit()